@@ -0,0 +1,100 @@
+"""Decode time and memory of a synthetic store index.
+
+Each mode runs in its own process, so that resident memory is not shared:
+
+- `validate`: every item validated by `PluginSchema`, like a fresh index
+  from a mirror
+- `decode`: `Plugin.decode`, like an index from the cache
+- `decode+read`: `Plugin.decode` then every field read once, like
+  building the search index
+- `refresh`: `validate_index` against the previous index with 1% of the
+  items changed, like a refresh from a mirror
+"""
+import sys
+import time
+import subprocess
+import tracemalloc
+from typing import Any, Dict, List
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+MODES = ["validate", "decode", "decode+read", "refresh"]
+
+
+def make_index(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "module_name": f"nonebot_plugin_demo{i}",
+            "project_link": f"nonebot-plugin-demo{i}",
+            "name": f"Demo Plugin {i}",
+            "desc": f"A demo plugin number {i} for weather and music",
+            "author": f"author{i % 500}",
+            "homepage": f"https://github.com/author{i % 500}/demo{i}",
+            "tags": [
+                {"label": f"tag{(i + j) % 40}", "color": "#ea5252"}
+                for j in range(i % 4)
+            ],
+            "is_official": i % 10 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def rss_kib() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run(mode: str, count: int):
+    from nb_cli_plugin_rplugin.storage import CacheEntry
+    from nb_cli_plugin_rplugin.meta import Plugin, PluginSchema, validate_index
+
+    data, hashes = validate_index(make_index(count))
+    previous = CacheEntry(data=data, hashes=hashes, fetched_at=0)
+
+    def decode(index):
+        if mode == "validate":
+            return [PluginSchema.parse_obj(item) for item in index]
+        if mode == "refresh":
+            for item in index[::100]:
+                item["desc"] += " (changed)"
+            return validate_index(index, previous)[0]
+        plugins = Plugin.decode(index)
+        if mode == "decode+read":
+            for plugin in plugins:
+                for name in PluginSchema.__fields__:
+                    getattr(plugin, name)
+        return plugins
+
+    # warm up and best of 5, each on a fresh copy of the index
+    times = []
+    for _ in range(6):
+        index = make_index(count)
+        start = time.perf_counter()
+        decode(index)
+        times.append(time.perf_counter() - start)
+
+    index = make_index(count)
+    rss = rss_kib()
+    tracemalloc.start()
+    plugins = decode(index)
+    del index
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{mode:12} {min(times[1:]) * 1000:8.1f}ms "
+        f"{size / 1024:9.0f}KiB retained "
+        f"{rss_kib() - rss:7}KiB rss ({len(plugins)} plugins)"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run(sys.argv[2], COUNT)
+    else:
+        for mode in MODES:
+            subprocess.run(
+                [sys.executable, __file__, str(COUNT), mode], check=True
+            )
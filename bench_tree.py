@@ -0,0 +1,279 @@
+"""Requests per second of the dependency tree against a local TLS stub.
+
+The stub serves a synthetic store index and PyPI metadata over HTTPS with
+a self-signed certificate (made with `openssl`), where every plugin
+depends on two others, with `DELAY_MS` of latency per request. It runs in
+its own process, so that it does not share the GIL with the client, and
+so does each run of a mode, with its own cache directory:
+
+- `cold`: empty cache, every package is fetched over kept-alive
+  connections
+- `no-keepalive`: the same with a new connection and TLS handshake per
+  request
+- `revalidate`: cached metadata past its TTL, every package is revalidated
+  with a conditional request
+
+Each mode runs `ROUNDS` times and the best run is shown.
+
+What this measures, and what it does not: on loopback a TLS handshake
+costs about a millisecond of CPU and no round trips, so connection reuse
+only wins that CPU time back. On a 1 CPU machine, with the stub and the
+client sharing the core, `cold` measured about 130 req/s against about
+120 req/s for `no-keepalive`, a difference close to the noise between
+runs. Against a remote server every new connection also costs the
+TCP and TLS round trips, which this benchmark does not simulate, so it
+is a regression check of the tree's throughput rather than a measure of
+what keep-alive saves in practice.
+
+Usage: `python bench_tree.py [PLUGINS] [ROOTS] [DELAY_MS] [ROUNDS]`
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import shutil
+import tempfile
+import itertools
+import threading
+import subprocess
+from typing import Any, Dict, List, Tuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PLUGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+ROOTS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+DELAY_MS = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+ROUNDS = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+# set for the stub and mode processes
+SERVE = os.getenv("BENCH_SERVE")
+MODE = os.getenv("BENCH_MODE")
+MODES: Dict[str, Dict[str, str]] = {
+    "cold": {},
+    "no-keepalive": {"RPLUGIN_MAX_KEEPALIVE_CONNECTIONS": "0"},
+    "revalidate": {"RPLUGIN_PYPI_TTL": "0"},
+}
+
+
+def make_index(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "module_name": f"nonebot_plugin_demo{i}",
+            "project_link": f"nonebot-plugin-demo{i}",
+            "name": f"Demo Plugin {i}",
+            "desc": f"A demo plugin number {i}",
+            "author": f"author{i % 50}",
+            "homepage": f"https://github.com/author{i % 50}/demo{i}",
+            "tags": [],
+            "is_official": False,
+        }
+        for i in range(count)
+    ]
+
+
+def make_pypi(name: str, count: int) -> Dict[str, Any]:
+    requires = ["nonebot2>=2.0.0", "httpx>=0.23"]
+    if name.startswith("nonebot-plugin-demo"):
+        i = int(name[len("nonebot-plugin-demo") :])
+        requires += [
+            f"nonebot-plugin-demo{(i * 7 + 1) % count}>=0.1",
+            f"nonebot-plugin-demo{(i * 3 + 2) % count}>=0.1",
+        ]
+    elif name == "nonebot2":
+        requires = ["pydantic>=1.10", "loguru>=0.6"]
+    else:
+        requires = []
+    return {
+        "info": {
+            "name": name,
+            "version": "0.2.0",
+            "requires_dist": requires,
+            "requires_python": ">=3.8",
+            "keywords": "nonebot",
+            "description": "text " * 2000,
+        },
+        "releases": {},
+        "urls": [],
+    }
+
+
+def make_certificate(directory: str) -> Tuple[str, str]:
+    """A self-signed certificate for 127.0.0.1, made with `openssl`."""
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "ec",
+            "-pkeyopt",
+            "ec_paramgen_curve:prime256v1",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=127.0.0.1",
+            "-addext",
+            "subjectAltName=IP:127.0.0.1",
+            "-keyout",
+            key,
+            "-out",
+            cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def serve(port_file: str, cert: str, key: str):
+    index = json.dumps(make_index(PLUGINS)).encode()
+    # the stub shares the CPU with the client, keep its work small
+    bodies: Dict[str, bytes] = {}
+    requests = [0]
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status: int, body: bytes = b"", etag: str = ""):
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/_requests":
+                return self.send(200, str(requests[0]).encode())
+            with lock:
+                requests[0] += 1
+            time.sleep(DELAY_MS / 1000)
+            if self.path == "/plugins.json":
+                return self.send(200, index)
+            if self.path.startswith("/pypi/"):
+                name = self.path.split("/")[2]
+                etag = f'"{name}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304, etag=etag)
+                if (body := bodies.get(name)) is None:
+                    body = bodies[name] = json.dumps(
+                        make_pypi(name, PLUGINS)
+                    ).encode()
+                return self.send(200, body, etag)
+            self.send(404, b'{"message": "Not Found"}')
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    # handshakes happen in the handler threads, not one by one in accept
+    server.socket = context.wrap_socket(
+        server.socket, server_side=True, do_handshake_on_connect=False
+    )
+    with open(port_file, "w") as f:
+        f.write(str(server.server_address[1]))
+    server.serve_forever()
+
+
+def served(url: str) -> int:
+    from urllib.request import urlopen
+
+    context = ssl.create_default_context(cafile=os.environ["SSL_CERT_FILE"])
+    with urlopen(f"{url}/_requests", context=context) as resp:
+        return int(resp.read())
+
+
+async def resolve_tree(url: str):
+    from nb_cli_plugin_rplugin.meta import get_plugins
+    from nb_cli_plugin_rplugin.client import close_clients
+    from nb_cli_plugin_rplugin.manager import DependencyGraph, _init
+
+    await _init()
+    plugins = (await get_plugins())[:ROOTS]
+    before = served(url)
+    start = time.perf_counter()
+    graph = DependencyGraph(plugins, include_all=True)
+    await graph.resolve()
+    elapsed = time.perf_counter() - start
+    await close_clients()
+    if errors := [v for v in graph.metas.values() if isinstance(v, Exception)]:
+        raise errors[0]
+    return len(graph.metas), served(url) - before, elapsed
+
+
+def run(url: str):
+    import asyncio
+
+    print(json.dumps(asyncio.run(resolve_tree(url))))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        port_file = os.path.join(tmp, "port")
+        cert, key = make_certificate(tmp)
+        server = subprocess.Popen(
+            [sys.executable, *sys.argv],
+            env={
+                **os.environ,
+                "BENCH_SERVE": port_file,
+                "BENCH_CERT": cert,
+                "BENCH_KEY": key,
+            },
+        )
+        try:
+            while not os.path.exists(port_file) or not open(port_file).read():
+                time.sleep(0.05)
+            url = f"https://127.0.0.1:{open(port_file).read()}"
+            best: Dict[str, Tuple[int, int, float]] = {}
+            for _, (mode, env) in itertools.product(
+                range(ROUNDS), MODES.items()
+            ):
+                cache_dir = os.path.join(tmp, "cache")
+                if mode != "revalidate":
+                    # `revalidate` reuses the cache of the previous mode
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                proc = subprocess.run(
+                    [sys.executable, *sys.argv],
+                    env={
+                        "BENCH_MODE": mode,
+                        **os.environ,
+                        "RPLUGIN_CACHE_DIR": cache_dir,
+                        "RPLUGIN_STORE_MIRRORS": f"{url}/plugins.json",
+                        "RPLUGIN_PYPI_URL": f"{url}/pypi",
+                        "BENCH_URL": url,
+                        # trusted by httpx and `served`
+                        "SSL_CERT_FILE": cert,
+                        **env,
+                    },
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                packages, requests, elapsed = json.loads(proc.stdout)
+                if mode not in best or elapsed < best[mode][2]:
+                    best[mode] = (packages, requests, elapsed)
+        finally:
+            server.terminate()
+            server.wait()
+    for mode, (packages, requests, elapsed) in best.items():
+        print(
+            f"{mode:13} {packages:4} packages {requests:4} requests "
+            f"in {elapsed * 1000:7.1f}ms {requests / elapsed:7.0f} req/s"
+        )
+
+
+if __name__ == "__main__":
+    if SERVE:
+        serve(SERVE, os.environ["BENCH_CERT"], os.environ["BENCH_KEY"])
+    elif MODE:
+        run(os.environ["BENCH_URL"])
+    else:
+        main()
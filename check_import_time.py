@@ -0,0 +1,86 @@
+"""Import time budget of the `nb` entry point.
+
+`nb` installs every plugin before doing anything, so whatever
+`installer:install` imports is paid by every `nb` command. This runs it
+under `python -X importtime` and fails if it gets over budget or imports
+the implementation.
+"""
+import os
+import sys
+import subprocess
+from typing import Dict, List, Tuple
+
+# microseconds, on top of what `nb_cli.cli` imports by itself
+BUDGET = int(os.environ.get("RPLUGIN_IMPORT_BUDGET", 10000))
+# only needed once `rplugin` is invoked
+FORBIDDEN = [
+    "nb_cli_plugin_rplugin.cli",
+    "nb_cli_plugin_rplugin.meta",
+    "nb_cli_plugin_rplugin.handler",
+    "rich.markdown",
+    "packaging",
+]
+# only needed by some subcommands
+DEFERRED = ["rich.markdown", "rich.syntax", "packaging", "webbrowser"]
+
+SETUP = "import nb_cli.cli"
+INSTALL = "from nb_cli_plugin_rplugin.installer import install; install()"
+INVOKE = "import nb_cli_plugin_rplugin.cli"
+
+
+def import_times(code: str) -> List[Tuple[str, int]]:
+    """(module, self time in us) of each module imported by `code`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        if self_time.strip().isdigit():
+            times.append((name.strip(), int(self_time)))
+    return times
+
+
+def added_by(code: str, runs: int = 5) -> Dict[str, int]:
+    """Modules `code` imports after `SETUP`, best of `runs`."""
+    base = {name for name, _ in import_times(SETUP)}
+    best: Dict[str, int] = {}
+    for _ in range(runs):
+        for name, self_time in import_times(f"{SETUP}; {code}"):
+            if name not in base:
+                best[name] = min(best.get(name, self_time), self_time)
+    return best
+
+
+def main() -> int:
+    failed = False
+
+    modules = added_by(INSTALL)
+    total = sum(modules.values())
+    print(f"install: {total / 1000:.1f}ms in {len(modules)} modules")
+    for name, self_time in sorted(modules.items(), key=lambda x: -x[1])[:5]:
+        print(f"  {self_time / 1000:6.1f}ms {name}")
+    if total > BUDGET:
+        print(f"over budget of {BUDGET / 1000:.1f}ms")
+        failed = True
+    for name in modules:
+        if any(name == m or name.startswith(f"{m}.") for m in FORBIDDEN):
+            print(f"install imports {name}")
+            failed = True
+
+    modules = added_by(INVOKE, runs=1)
+    for name in modules:
+        if any(name == m or name.startswith(f"{m}.") for m in DEFERRED):
+            print(f"rplugin imports {name} before it is needed")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
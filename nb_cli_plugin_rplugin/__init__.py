@@ -1,12 +1,20 @@
 import gettext
 from pathlib import Path
+from functools import lru_cache
 
 from nb_cli.i18n import get_locale
 
-t = gettext.translation(
-    "nb-cli-plugin-rplugin",
-    localedir=Path(__file__).parent / "locale",
-    languages=[lang] if (lang := get_locale()) else None,
-    fallback=True,
-)
-_ = t.gettext
+
+@lru_cache(maxsize=None)
+def _translation() -> gettext.NullTranslations:
+    # loaded on first use, `nb` without `rplugin` never needs the catalog
+    return gettext.translation(
+        "nb-cli-plugin-rplugin",
+        localedir=Path(__file__).parent / "locale",
+        languages=[lang] if (lang := get_locale()) else None,
+        fallback=True,
+    )
+
+
+def _(message: str) -> str:
+    return _translation().gettext(message)
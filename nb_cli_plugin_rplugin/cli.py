@@ -1,11 +1,23 @@
-import webbrowser
+import time
+import shutil
+import tarfile
+import contextlib
 from typing import List, Optional, cast
 
 import click
 from nb_cli.config import GLOBAL_CONFIG
+from nb_cli.exceptions import ModuleLoadFailed
 from nb_cli.cli import ClickAliasedGroup, run_sync, run_async
 
-from . import _
+from . import _, meta, tracing
+from .config import get_config
+from .storage import load_entry
+from .client import close_clients
+from .resilience import start_deadline
+from .warm import WarmStatus, CacheWarmer
+from .github import GITHUB_CACHE_DIR, get_rate_limit
+from .snapshot import export_snapshot, import_snapshot
+from .exception import OfflineError, PluginNotFoundError, AmbiguousPluginError
 from .prompt import (
     Choice,
     ListPrompt,
@@ -13,19 +25,37 @@ from .prompt import (
     ConfirmPrompt,
     CheckboxPrompt,
 )
+from .output import (
+    FORMATS,
+    write_plugins,
+    write_outdated,
+    write_plugin_detail,
+    write_store_changes,
+    write_dependencies_tree,
+)
 from .meta import (
+    STORE_CACHE,
+    PYPI_CACHE_DIR,
     Plugin,
     get_plugins,
-    get_pypi_meta,
+    refresh_store,
     search_plugins,
+    get_store_changes,
     get_plugin_by_name,
+    get_plugins_by_names,
+    get_pypi_meta_with_description,
 )
 from .handler import (
+    PluginPages,
+    print_warm,
     print_syntax,
-    print_plugins,
+    print_profile,
     install_plugin,
     print_markdown,
+    print_outdated,
     print_plugin_detail,
+    print_store_changes,
+    sort_plugins_by_stars,
     print_dependencies_tree,
 )
 
@@ -33,14 +63,74 @@ from .handler import (
 NEXT = _("What do you want to do next?")
 
 
+class RPluginGroup(ClickAliasedGroup):
+    def invoke(self, ctx: click.Context):
+        try:
+            return super().invoke(ctx)
+        except OfflineError as e:
+            click.secho(
+                _(
+                    "{e} Import a snapshot with `nb rplugin snapshot import` "
+                    "or run without --offline."
+                ).format(e=e),
+                fg="red",
+                err=True,
+            )
+            ctx.exit(1)
+
+
 @click.group(
-    cls=ClickAliasedGroup,
+    cls=RPluginGroup,
     invoke_without_command=True,
     help=_("Manage Bot Plugin with rich text."),
 )
+@click.option(
+    "--offline",
+    is_flag=True,
+    default=False,
+    help=_("Only use cached data, never access the network."),
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help=_("Print where the time went when the command ends."),
+)
+@click.option(
+    "--trace",
+    "trace_file",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help=_("Write a Chrome trace event file, implies --profile."),
+)
 @click.pass_context
 @run_async
-async def rplugin(ctx: click.Context):
+async def rplugin(
+    ctx: click.Context,
+    offline: bool,
+    profile: bool,
+    trace_file: Optional[str],
+):
+    config = get_config()
+    if offline:
+        config.offline = True
+    if profile or trace_file:
+        tracer = tracing.enable()
+
+        def _report():
+            print_profile(tracer)
+            if trace_file:
+                tracer.write_chrome_trace(trace_file)
+
+        # runs last, after the clients are closed
+        ctx.call_on_close(_report)
+    if config.snapshot is not None and load_entry(STORE_CACHE) is None:
+        # seed an empty cache, e.g. on a machine without internet access
+        with contextlib.suppress(OSError, tarfile.TarError, ValueError):
+            await run_sync(import_snapshot)(config.snapshot)
+    ctx.call_on_close(run_async(close_clients))
+    # close callbacks run in reverse order, this one before `close_clients`
+    ctx.call_on_close(run_async(meta.wait_background_tasks))
     if ctx.invoked_subcommand is not None:
         return
 
@@ -70,9 +160,15 @@ async def rplugin(ctx: click.Context):
 
 
 async def _prompt_choice_page(
-    ctx: click.Context, plugins: List[Plugin], count: int, page: int
+    ctx: click.Context,
+    plugins: List[Plugin],
+    count: int,
+    page: int,
+    disable_github: bool = False,
 ):
-    all_pages, now_plugins = print_plugins(plugins, count, page)
+    plugin_pages = PluginPages(plugins, count, disable_github)
+    all_pages = plugin_pages.pages
+    now_plugins = await plugin_pages.print(page)
 
     async def _next_page():
         nonlocal page
@@ -120,15 +216,6 @@ async def _prompt_choice_page(
         )
 
         if plugins := [choice.data for choice in result]:
-            for plugin in plugins:
-                try:
-                    GLOBAL_CONFIG.add_plugin(plugin.module_name)
-                except RuntimeError as e:
-                    click.echo(
-                        _(
-                            "Failed to add plugin {plugin.name} to config: {e}"
-                        ).format(plugin=plugin, e=e)
-                    )
             await install_plugin(plugins=plugins, pypi_args=None)
         ctx.exit()
 
@@ -146,38 +233,41 @@ async def _prompt_choice_page(
         _("Go to the specified page."), _choose_specified_page
     )
 
-    while True:
-        if all_pages == 1:
-            # 只有一页
-            choices = []
-        elif page == 1:
-            # 在第一页
-            choices = [all_choices[1], choose_page_choice]
-        elif page == all_pages:
-            # 在最后一页
-            choices = [all_choices[0], choose_page_choice]
-        else:
-            choices = [*all_choices, choose_page_choice]
-        choices.extend(
-            (
-                Choice(
-                    _("Show details of plugins."),
-                    _show_plugins_detail,
-                ),
-                Choice(_("Install plugins."), _install_plugins),
+    try:
+        while True:
+            if all_pages == 1:
+                # 只有一页
+                choices = []
+            elif page == 1:
+                # 在第一页
+                choices = [all_choices[1], choose_page_choice]
+            elif page == all_pages:
+                # 在最后一页
+                choices = [all_choices[0], choose_page_choice]
+            else:
+                choices = [*all_choices, choose_page_choice]
+            choices.extend(
+                (
+                    Choice(
+                        _("Show details of plugins."),
+                        _show_plugins_detail,
+                    ),
+                    Choice(_("Install plugins."), _install_plugins),
+                )
             )
-        )
 
-        result = await ListPrompt(
-            ctx,
-            NEXT,
-            choices=choices,
-        )
-        click.clear()
-        await result.data()
-        if result.name == _("Show details of plugins."):
-            break
-        __, now_plugins = print_plugins(plugins, count, page)
+            result = await ListPrompt(
+                ctx,
+                NEXT,
+                choices=choices,
+            )
+            click.clear()
+            await result.data()
+            if result.name == _("Show details of plugins."):
+                break
+            now_plugins = await plugin_pages.print(page)
+    finally:
+        plugin_pages.close()
 
 
 async def _detail_prompt(
@@ -189,24 +279,20 @@ async def _detail_prompt(
     await print_plugin_detail(plugin, disable_github, disable_pypi)
 
     async def _open_homepage():
+        import webbrowser
+
         webbrowser.open(plugin.homepage)
 
     async def _open_pypi():
+        import webbrowser
+
         webbrowser.open(f"https://pypi.org/project/{plugin.project_link}")
 
     async def _install_plugin():
-        try:
-            GLOBAL_CONFIG.add_plugin(plugin.module_name)
-        except RuntimeError as e:
-            click.echo(
-                _("Failed to add plugin {plugin.name} to config: {e}").format(
-                    plugin=plugin, e=e
-                )
-            )
         await install_plugin(plugins=[plugin], pypi_args=None)
 
     async def _print_readme():
-        pypi = await get_pypi_meta(plugin.project_link)
+        pypi = await get_pypi_meta_with_description(plugin.project_link)
         if pypi.description_content_type != "text/markdown":
             result = await ConfirmPrompt(
                 ctx,
@@ -223,7 +309,7 @@ async def _detail_prompt(
         else:
             print_ = print_markdown
         click.clear()
-        print_(pypi.description)
+        print_(pypi.description or "")
 
     result = await ListPrompt(
         ctx,
@@ -253,13 +339,52 @@ async def _detail_prompt(
 @click.option(
     "-p", "--page", default=1, help=_("The specified page of plugins.")
 )
+@click.option(
+    "-s",
+    "--sort",
+    type=click.Choice(["default", "stars"]),
+    default="default",
+    help=_("Sort plugins by store order or GitHub stars."),
+)
+@click.option(
+    "--disable-github",
+    is_flag=True,
+    default=False,
+    help=_("Disable to show GitHub statistics."),
+)
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(FORMATS),
+    default="text",
+    help=_("Output format, json and ndjson are not interactive."),
+)
+@click.option(
+    "--with-pypi",
+    is_flag=True,
+    default=False,
+    help=_("Add PyPI metadata to json and ndjson output."),
+)
 @run_async
 async def list(
     ctx: click.Context,
     count: int,
     page: int,
+    sort: str,
+    disable_github: bool,
+    format_: str,
+    with_pypi: bool,
 ):
-    await _prompt_choice_page(ctx, await get_plugins(), count, page)
+    if format_ != "text":
+        start_deadline()
+    plugins = await get_plugins()
+    if sort == "stars":
+        plugins = await sort_plugins_by_stars(plugins)
+    if format_ != "text":
+        await write_plugins(plugins, format_, disable_github, with_pypi)
+        return
+    await _prompt_choice_page(ctx, plugins, count, page, disable_github)
 
 
 @rplugin.command(help=_("Search plugins in store."))
@@ -271,14 +396,58 @@ async def list(
 @click.option(
     "-p", "--page", default=1, help=_("The specified page of plugins.")
 )
+@click.option(
+    "-s",
+    "--sort",
+    type=click.Choice(["default", "stars"]),
+    default="default",
+    help=_("Sort plugins by store order or GitHub stars."),
+)
+@click.option(
+    "--disable-github",
+    is_flag=True,
+    default=False,
+    help=_("Disable to show GitHub statistics."),
+)
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(FORMATS),
+    default="text",
+    help=_("Output format, json and ndjson are not interactive."),
+)
+@click.option(
+    "--with-pypi",
+    is_flag=True,
+    default=False,
+    help=_("Add PyPI metadata to json and ndjson output."),
+)
 @run_async
 async def search(
-    ctx: click.Context, name: Optional[str], count: int, page: int
+    ctx: click.Context,
+    name: Optional[str],
+    count: int,
+    page: int,
+    sort: str,
+    disable_github: bool,
+    format_: str,
+    with_pypi: bool,
 ):
     if name is None:
+        if format_ != "text":
+            raise click.UsageError(_("Missing argument NAME."))
         name = await InputPrompt(ctx, _("Plugin name to search:"))
-    if plugins := search_plugins(await get_plugins(), name):
-        await _prompt_choice_page(ctx, plugins, count, page)
+    if format_ != "text":
+        start_deadline()
+    plugins = search_plugins(await get_plugins(), name)
+    if plugins and sort == "stars":
+        plugins = await sort_plugins_by_stars(plugins)
+    if format_ != "text":
+        await write_plugins(plugins, format_, disable_github, with_pypi)
+        ctx.exit(0 if plugins else 1)
+    if plugins:
+        await _prompt_choice_page(ctx, plugins, count, page, disable_github)
     ctx.exit(1)
 
 
@@ -296,6 +465,14 @@ async def search(
     default=False,
     help=_("Disable to show PyPI metadata."),
 )
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(FORMATS),
+    default="text",
+    help=_("Output format, json and ndjson are not interactive."),
+)
 @click.pass_context
 @run_async
 async def info(
@@ -303,13 +480,39 @@ async def info(
     name: Optional[str],
     disable_github: bool,
     disable_pypi: bool,
+    format_: str,
 ):
     if name is None:
+        if format_ != "text":
+            raise click.UsageError(_("Missing argument NAME."))
         name = await InputPrompt(ctx, _("Plugin name to show:"))
+    if format_ != "text":
+        start_deadline()
+    plugins = await get_plugins()
     try:
-        plugin = get_plugin_by_name(name, await get_plugins())
-    except Exception:
+        plugin = get_plugin_by_name(name, plugins)
+    except AmbiguousPluginError as e:
+        click.secho(
+            _("{name} matches multiple plugins: {plugins}").format(
+                name=name,
+                plugins=", ".join(p.project_link for p in e.candidates),
+            ),
+            fg="yellow",
+            err=format_ != "text",
+        )
         ctx.exit(1)
+    except PluginNotFoundError:
+        click.secho(
+            _("Plugin {name} not found.").format(name=name),
+            fg="red",
+            err=format_ != "text",
+        )
+        ctx.exit(1)
+    if format_ != "text":
+        await write_plugin_detail(
+            plugin, format_, disable_github, disable_pypi
+        )
+        return
     await _detail_prompt(
         ctx,
         plugin,
@@ -319,25 +522,273 @@ async def info(
 
 
 @rplugin.command(help=_("Show dependency tree of this project's plugins."))
+@click.option(
+    "-a",
+    "--all",
+    "include_all",
+    is_flag=True,
+    default=False,
+    help=_("Include dependencies that are not in the store."),
+)
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(FORMATS),
+    default="text",
+    help=_("Output format, json and ndjson are not interactive."),
+)
 @run_async
-async def tree():
-    click.secho(
-        _("Parsing dependency tree takes a while, please wait."), fg="yellow"
-    )
+async def tree(include_all: bool, format_: str):
+    start_deadline()
+    text = format_ == "text"
+    if text:
+        click.secho(
+            _("Parsing dependency tree takes a while, please wait."),
+            fg="yellow",
+        )
 
     config = GLOBAL_CONFIG.get_nonebot_config()
 
-    store_plugins = await get_plugins()
-    plugins: List[Plugin] = []
+    found, errors = get_plugins_by_names(config.plugins, await get_plugins())
+    for module_name, e in errors.items():
+        click.echo(
+            _("Failed to get metadata for {module_name}, Ignored: {e}").format(
+                module_name=module_name, e=e
+            ),
+            err=not text,
+        )
+
+    if text:
+        await print_dependencies_tree([*found.values()], include_all)
+    else:
+        await write_dependencies_tree([*found.values()], format_, include_all)
+
+
+@rplugin.command(
+    help=_("Check the configured plugins for newer versions on PyPI.")
+)
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(FORMATS),
+    default="text",
+    help=_("Output format, json and ndjson are not interactive."),
+)
+@run_async
+async def outdated(format_: str):
+    start_deadline()
+    config = GLOBAL_CONFIG.get_nonebot_config()
+
+    found, errors = get_plugins_by_names(config.plugins, await get_plugins())
+    for module_name, e in errors.items():
+        click.echo(
+            _("Failed to get metadata for {module_name}, Ignored: {e}").format(
+                module_name=module_name, e=e
+            ),
+            err=format_ != "text",
+        )
+
+    if format_ == "text":
+        await print_outdated([*found.values()])
+    else:
+        await write_outdated([*found.values()], format_)
+
+
+@rplugin.command(help=_("Show what changed in the store at the last refresh."))
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help=_("Refresh the store index first."),
+)
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    type=click.Choice(FORMATS),
+    default="text",
+    help=_("Output format, json and ndjson are not interactive."),
+)
+@run_async
+async def changes(refresh: bool, format_: str):
+    start_deadline()
+    if refresh:
+        await refresh_store()
+    else:
+        # an expired index is refreshed, which records its changes
+        await get_plugins()
+
+    store_changes = get_store_changes()
+    if format_ != "text":
+        write_store_changes(store_changes, format_)
+    elif store_changes is None:
+        click.echo(
+            _(
+                "No changes recorded yet, "
+                "they are recorded when the store index is refreshed."
+            )
+        )
+    else:
+        print_store_changes(store_changes)
+
 
-    for module_name in config.plugins:
+@rplugin.command(
+    help=_("Prefetch PyPI metadata and GitHub statistics into the cache.")
+)
+@click.pass_context
+@click.argument("query", nargs=1, required=False, default=None)
+@click.option(
+    "--project",
+    is_flag=True,
+    default=False,
+    help=_("Only this project's plugins and their dependencies."),
+)
+@run_async
+async def warm(ctx: click.Context, query: Optional[str], project: bool):
+    config = get_config()
+    if config.offline:
+        raise click.UsageError(_("The cache cannot be warmed offline."))
+    if query and project:
+        raise click.UsageError(
+            _("QUERY and --project cannot be used together.")
+        )
+    # no deadline, the run grows with the store and requests still have
+    # their timeouts
+
+    entry = load_entry(STORE_CACHE)
+    if entry is None or entry.age >= config.store_ttl:
         try:
-            plugins.append(get_plugin_by_name(module_name, store_plugins))
-        except Exception as e:
+            await refresh_store()
+        except ModuleLoadFailed:
+            if entry is None:
+                raise
+    plugins = await get_plugins()
+    if project:
+        found, errors = get_plugins_by_names(
+            GLOBAL_CONFIG.get_nonebot_config().plugins, plugins
+        )
+        for module_name, e in errors.items():
             click.echo(
                 _(
                     "Failed to get metadata for {module_name}, Ignored: {e}"
                 ).format(module_name=module_name, e=e)
             )
+        plugins = [*found.values()]
+    elif query:
+        plugins = search_plugins(plugins, query)
+
+    counts = await print_warm(CacheWarmer(plugins, dependencies=project))
+    if counts[WarmStatus.FAILED]:
+        ctx.exit(1)
 
-    await print_dependencies_tree(plugins)
+
+@rplugin.command(help=_("Show or clear the local store cache."))
+@click.option(
+    "--clear",
+    is_flag=True,
+    default=False,
+    help=_("Remove all cached data."),
+)
+@run_async
+async def cache(clear: bool):
+    config = get_config()
+    if clear:
+        await run_sync(shutil.rmtree)(config.cache_dir, ignore_errors=True)
+        click.secho(_("Cache cleared."), fg="green")
+        return
+
+    plugins = await get_plugins()
+    click.echo(_("Cache directory: {path}").format(path=config.cache_dir))
+    click.echo(
+        _("Store index: {status} ({count} plugins)").format(
+            status=meta.STORE_CACHE_STATUS.value
+            if meta.STORE_CACHE_STATUS
+            else "-",
+            count=len(plugins),
+        )
+    )
+    if entry := load_entry(STORE_CACHE):
+        click.echo(
+            _("Fetched {age:.0f}s ago from {url}").format(
+                age=entry.age, url=entry.url
+            )
+        )
+    click.echo(
+        _("PyPI metadata: {count} packages").format(
+            count=sum(
+                not path.name.endswith(".description.json")
+                for path in (config.cache_dir / PYPI_CACHE_DIR).glob("*.json")
+            )
+        )
+    )
+    click.echo(
+        _("GitHub statistics: {count} repositories").format(
+            count=len(
+                [*(config.cache_dir / GITHUB_CACHE_DIR).rglob("repos/*/*")]
+            )
+        )
+    )
+    rate_limit = get_rate_limit()
+    if rate_limit.remaining is not None and not rate_limit.expired:
+        click.echo(
+            _(
+                "GitHub API rate limit: {remaining}/{limit}, reset at {reset}"
+            ).format(
+                remaining=rate_limit.remaining,
+                limit=rate_limit.limit or "-",
+                reset=time.strftime(
+                    "%H:%M:%S", time.localtime(rate_limit.reset)
+                ),
+            )
+        )
+
+
+@rplugin.group(
+    cls=ClickAliasedGroup,
+    invoke_without_command=True,
+    help=_("Export or import a snapshot of the cached data."),
+)
+@click.pass_context
+def snapshot(ctx: click.Context):
+    if ctx.invoked_subcommand is None:
+        click.echo(ctx.get_help())
+
+
+@snapshot.command(
+    "export", help=_("Pack the cached store, PyPI and GitHub data to FILE.")
+)
+@click.argument("file", type=click.Path(dir_okay=False, writable=True))
+@run_async
+async def export_(file: str):
+    if load_entry(STORE_CACHE) is None:
+        await get_plugins()
+    count = await run_sync(export_snapshot)(file)
+    click.secho(
+        _("Exported {count} cached files to {file}.").format(
+            count=count, file=file
+        ),
+        fg="green",
+    )
+
+
+@snapshot.command(
+    "import",
+    help=_("Unpack FILE into the cache, keeping data fetched later."),
+)
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+@run_async
+async def import_(ctx: click.Context, file: str):
+    try:
+        imported, skipped = await run_sync(import_snapshot)(file)
+    except (OSError, tarfile.TarError, ValueError) as e:
+        click.secho(_("Failed to import snapshot: {e}").format(e=e), fg="red")
+        ctx.exit(1)
+    click.secho(
+        _("Imported {imported} cached files, {skipped} skipped.").format(
+            imported=imported, skipped=skipped
+        ),
+        fg="green",
+    )
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Dict, Optional
+from importlib.util import find_spec
+
+import httpx
+
+from .config import get_config
+from .tracing import TracingTransport, get_tracer
+
+HTTP2_AVAILABLE = find_spec("h2") is not None
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+
+def _proxy_for(url: httpx.URL) -> Optional[str]:
+    """`RPLUGIN_PROXY`, else the system proxy for `url`.
+
+    The client is given its own transport, so httpx does not read the proxy
+    environment variables by itself.
+    """
+    if proxy := get_config().proxy:
+        return proxy
+    from urllib.request import getproxies, proxy_bypass
+
+    if proxy_bypass(url.host):
+        return None
+    proxies = getproxies()
+    return proxies.get(url.scheme) or proxies.get("all")
+
+
+def _new_client(url: httpx.URL) -> httpx.AsyncClient:
+    config = get_config()
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+        http2=config.http2 and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+        ),
+        proxy=_proxy_for(url),
+    )
+    if (tracer := get_tracer()) is not None:
+        transport = TracingTransport(transport, tracer)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            config.read_timeout, connect=config.connect_timeout
+        ),
+        transport=transport,
+        follow_redirects=True,
+    )
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """Get the keep-alive client for the host of `url`.
+
+    Clients live until `close_clients` is called at the end of the command.
+    """
+    parsed = httpx.URL(url)
+    client = _CLIENTS.get(parsed.host)
+    if client is None or client.is_closed:
+        client = _CLIENTS[parsed.host] = _new_client(parsed)
+    return client
+
+
+async def close_clients() -> None:
+    clients = [*_CLIENTS.values()]
+    _CLIENTS.clear()
+    await asyncio.gather(
+        *(client.aclose() for client in clients), return_exceptions=True
+    )
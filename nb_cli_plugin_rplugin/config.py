@@ -0,0 +1,96 @@
+import os
+import sys
+from pathlib import Path
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, validator
+
+ENV_PREFIX = "RPLUGIN_"
+APP_NAME = "nb-cli-plugin-rplugin"
+
+
+def _user_cache_dir() -> Path:
+    if sys.platform == "win32":
+        base = Path(os.getenv("LOCALAPPDATA") or Path.home() / "AppData/Local")
+        return base / APP_NAME / "Cache"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / APP_NAME
+    base = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / APP_NAME
+
+
+class Config(BaseModel):
+    cache_dir: Path
+    # seconds a cached store index is served without asking the mirrors
+    store_ttl: int = 3600
+    # seconds after `store_ttl` a stale index is still served while it is
+    # revalidated in the background
+    store_stale_ttl: int = 7 * 24 * 3600
+    # seconds a command waits on exit for the background revalidation
+    revalidate_timeout: float = 5.0
+    # seconds cached PyPI metadata is used without revalidation
+    pypi_ttl: int = 24 * 3600
+    # only use cached data, never touch the network
+    offline: bool = False
+    # snapshot imported when the store index is not cached, see
+    # `nb rplugin snapshot`
+    snapshot: Optional[Path] = None
+    # store index mirrors, comma separated in the environment variable,
+    # empty means the builtin `meta.URLS`
+    store_mirrors: List[str] = []
+    # seconds to wait for the current mirrors before racing the next one
+    store_hedge_delay: float = 0.8
+    connect_timeout: float = 5.0
+    read_timeout: float = 20.0
+    # transient failures are retried at most `retries` times with
+    # exponential backoff starting at `backoff_base` seconds
+    retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    # packages fetched at once by commands working on many of them
+    concurrency: int = 16
+    # seconds each section of the detail view waits for its data
+    detail_timeout: float = 15.0
+    # seconds a non-interactive command may spend on network requests, 0 to
+    # disable; interactive ones wait for the user and have no deadline
+    deadline: float = 120.0
+    # consecutive failures before requests to a host are skipped for
+    # `circuit_cooldown` seconds
+    circuit_threshold: int = 5
+    circuit_cooldown: float = 30.0
+    pypi_url: str = "https://pypi.org/pypi"
+    github_api_url: str = "https://api.github.com"
+    # `GITHUB_TOKEN` is used when not set
+    github_token: Optional[str] = None
+    # seconds cached GitHub statistics are used without revalidation
+    github_ttl: int = 6 * 3600
+    # requests kept for uncached repositories, refreshing cached ones is
+    # deferred once the remaining rate limit drops to it
+    github_rate_reserve: int = 10
+    # connection pool of each host
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    # HTTP/2 is only used when `h2` is installed
+    http2: bool = True
+    proxy: Optional[str] = None
+
+    @validator("store_mirrors", pre=True)
+    def _split_list(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(",") if item.strip()]
+        return value
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Load config from `RPLUGIN_*` environment variables."""
+    values = {
+        key[len(ENV_PREFIX) :].lower(): value
+        for key, value in os.environ.items()
+        if key.startswith(ENV_PREFIX) and value
+    }
+    values.setdefault("cache_dir", _user_cache_dir())
+    if github_token := os.getenv("GITHUB_TOKEN"):
+        values.setdefault("github_token", github_token)
+    return Config.parse_obj(values)
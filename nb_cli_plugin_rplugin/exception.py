@@ -1,2 +1,66 @@
+import time
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from .meta import Plugin
+
+
 class PluginNotFoundError(Exception):
     """Plugin is not found."""
+
+
+class OfflineError(Exception):
+    """Data is not cached and network access is disabled."""
+
+
+class StatusError(RuntimeError):
+    """Server responded with an unexpected status code."""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: int,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(RuntimeError):
+    """Host failed too often recently, requests to it are skipped."""
+
+
+class DeadlineExceededError(RuntimeError):
+    """The command ran out of its time budget."""
+
+
+class RateLimitedError(RuntimeError):
+    """GitHub API rate limit is used up and nothing is cached."""
+
+    def __init__(self, reset: float):
+        super().__init__(reset)
+        self.reset = reset
+
+    def __str__(self) -> str:
+        return (
+            "GitHub API rate limit exceeded until {}, "
+            "set RPLUGIN_GITHUB_TOKEN for a higher limit".format(
+                time.strftime("%H:%M:%S", time.localtime(self.reset))
+            )
+        )
+
+
+class AmbiguousPluginError(Exception):
+    """Plugin name matches more than one plugin."""
+
+    def __init__(self, name: str, candidates: List["Plugin"]):
+        super().__init__(name, candidates)
+        self.name = name
+        self.candidates = candidates
+
+    def __str__(self) -> str:
+        return "{} matches {}".format(
+            self.name,
+            ", ".join(plugin.project_link for plugin in self.candidates),
+        )
@@ -0,0 +1,173 @@
+import re
+import time
+from typing import Any, Dict, List, Tuple, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from .config import get_config
+from .resilience import parse_retry_after
+from .storage import CacheEntry, load_entry, save_entry
+
+GITHUB_CACHE_DIR = "github"
+GITHUB_CACHE = GITHUB_CACHE_DIR + "/repos/{}.json"
+RATE_LIMIT_CACHE = GITHUB_CACHE_DIR + "/rate_limit/{}.json"
+# repositories queried by one GraphQL request
+GRAPHQL_BATCH = 50
+REPO_REGEX_INCLUDE_PATH = (
+    r"^https:\/\/github\.com\/([a-zA-Z0-9_-]+\/[a-zA-Z0-9_-]+)"
+)
+_REPOSITORY_FIELDS = """
+fragment stats on Repository {
+  nameWithOwner
+  stargazerCount
+  forkCount
+  isArchived
+  issues(states: OPEN) { totalCount }
+  pullRequests(states: OPEN) { totalCount }
+  licenseInfo { name spdxId }
+}
+"""
+
+
+class RateLimit(BaseModel):
+    """Last known primary rate limit of a GitHub API resource."""
+
+    resource: str = "core"
+    """`core` for the REST API, `graphql` for the GraphQL API."""
+    authenticated: bool = False
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset: float = 0
+    """Unix time the budget is refilled."""
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.reset
+
+    def allow(self, refresh: bool) -> bool:
+        """Whether a request may be spent now.
+
+        Refreshing data we already have cached is deferred once the budget
+        drops to `github_rate_reserve`, the rest is kept for data we have
+        nothing of.
+        """
+        if self.remaining is None or self.expired:
+            return True
+        reserve = get_config().github_rate_reserve if refresh else 0
+        return self.remaining > reserve
+
+    def update(self, resp: httpx.Response) -> None:
+        headers = resp.headers
+        if remaining := headers.get("X-RateLimit-Remaining"):
+            self.remaining = int(remaining)
+            self.limit = int(headers.get("X-RateLimit-Limit", 0)) or None
+            self.reset = float(headers.get("X-RateLimit-Reset", 0))
+        if is_rate_limited(resp):
+            # secondary rate limits only tell when to retry
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                self.reset = max(self.reset, time.time() + retry_after)
+            self.remaining = 0
+        save_entry(
+            RATE_LIMIT_CACHE.format(self.resource),
+            CacheEntry(data=self.dict(), fetched_at=time.time()),
+        )
+
+
+_RATE_LIMITS: Dict[str, RateLimit] = {}
+
+
+def get_rate_limit(resource: str = "core") -> RateLimit:
+    """Rate limit state, shared with previous invocations through disk."""
+    if (rate_limit := _RATE_LIMITS.get(resource)) is None:
+        authenticated = bool(get_config().github_token)
+        entry = load_entry(RATE_LIMIT_CACHE.format(resource))
+        if entry is not None:
+            rate_limit = RateLimit.parse_obj(entry.data)
+        # the budget of a token has nothing to do with the anonymous one
+        if rate_limit is None or rate_limit.authenticated != authenticated:
+            rate_limit = RateLimit(
+                resource=resource, authenticated=authenticated
+            )
+        _RATE_LIMITS[resource] = rate_limit
+    return rate_limit
+
+
+def is_rate_limited(resp: httpx.Response) -> bool:
+    if resp.status_code == httpx.codes.TOO_MANY_REQUESTS:
+        return True
+    if resp.status_code != httpx.codes.FORBIDDEN:
+        return False
+    if "Retry-After" in resp.headers:
+        return True
+    return resp.headers.get("X-RateLimit-Remaining") == "0"
+
+
+def github_headers() -> Dict[str, str]:
+    headers = {"Accept": "application/vnd.github+json"}
+    if token := get_config().github_token:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+
+def github_repo(homepage: str) -> Optional[str]:
+    """`owner/name` of a GitHub homepage."""
+    if match := re.match(REPO_REGEX_INCLUDE_PATH, homepage):
+        return match[1]
+
+
+def build_query(repos: List[str]) -> Dict[str, Any]:
+    """GraphQL request for `repos`, each aliased `r<index>`."""
+    params: List[str] = []
+    fields: List[str] = []
+    variables: Dict[str, str] = {}
+    for i, repo in enumerate(repos):
+        owner, name = repo.split("/")
+        params.append(f"$o{i}: String!, $n{i}: String!")
+        fields.append(
+            f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...stats }}"
+        )
+        variables[f"o{i}"] = owner
+        variables[f"n{i}"] = name
+    query = "query({}) {{\n{}\n}}{}".format(
+        ", ".join(params), "\n".join(fields), _REPOSITORY_FIELDS
+    )
+    return {"query": query, "variables": variables}
+
+
+def parse_repository(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a GraphQL repository to the shape of the REST API."""
+    license_ = node.get("licenseInfo")
+    # like REST, open issues include pull requests
+    open_issues = sum(
+        node[field]["totalCount"] for field in ("issues", "pullRequests")
+    )
+    return {
+        "full_name": node["nameWithOwner"],
+        "stargazers_count": node["stargazerCount"],
+        "open_issues_count": open_issues,
+        "forks_count": node["forkCount"],
+        "archived": node["isArchived"],
+        "license": {
+            "name": license_["name"],
+            "spdx_id": license_.get("spdxId") or "NOASSERTION",
+        }
+        if license_
+        else None,
+    }
+
+
+def parse_response(
+    repos: List[str], data: Dict[str, Any]
+) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    """Pair each of `repos` with its repository, `None` if not found or
+    malformed."""
+    result: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+    for i, repo in enumerate(repos):
+        node = data.get(f"r{i}")
+        try:
+            result.append((repo, parse_repository(node) if node else None))
+        except (AttributeError, KeyError, TypeError):
+            result.append((repo, None))
+    return result
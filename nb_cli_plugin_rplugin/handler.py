@@ -1,37 +1,62 @@
 import re
+import time
 import asyncio
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Hashable, Optional, Awaitable
 
 from rich.live import Live
 from rich.text import Text
-from rich.tree import Tree
 from rich.panel import Panel
 from rich.style import Style
-from rich.syntax import Syntax
+from rich.table import Table
 from rich.columns import Columns
 from rich.console import Console
-from rich.markdown import Markdown
+from rich.segment import Segments
 from nb_cli.handlers import call_pip_install
+from rich.progress import (
+    Progress,
+    BarColumn,
+    TextColumn,
+    SpinnerColumn,
+    TimeElapsedColumn,
+    MofNCompleteColumn,
+)
 
 from . import _
-from .manager import _init, get_version, parse_depends_tree
+from .config import get_config
+from .github import github_repo
+from .storage import CacheStatus
+from .tracing import Tracer, span
+from .warm import WarmStatus, CacheWarmer
+from .manager import (
+    PluginUpdate,
+    DependencyGraph,
+    _init,
+    check_updates,
+    restore_config,
+    pin_requirements,
+    get_plugin_version,
+    add_plugins_to_config,
+)
 from .meta import (
+    Repo,
     Plugin,
-    get_pypi_meta,
+    StoreChanges,
     get_pypi_meta_retry,
+    get_cached_pypi_meta,
     get_github_statistics,
+    get_plugins_statistics,
+    get_cached_github_statistics,
 )
 
 REPO_REGEX = r"^https:\/\/github\.com\/([a-zA-Z0-9_-]+\/[a-zA-Z0-9_-]+)$"
-REPO_REGEX_INCLUDE_PATH = (
-    r"^https:\/\/github\.com\/([a-zA-Z0-9_-]+\/[a-zA-Z0-9_-]+)"
-)
 console = Console()
 
 # i18n
 AUTHOR = _('Author')
 PACKAGE = _('Package')
 HOMEPAGE = _('Homepage')
+ARCHIVED = _('Archived')
+LOADING = _('Loading...')
 
 
 def _parse_homepage(address: str) -> Text:
@@ -39,7 +64,7 @@ def _parse_homepage(address: str) -> Text:
     return Text(text, style=Style(link=address))
 
 
-def _make_panel(plugin: Plugin) -> Panel:
+def _make_panel(plugin: Plugin, repo: Optional[Repo] = None) -> Panel:
     message = Text(plugin.desc + "\n\n", no_wrap=False, overflow="ellipsis")
     message.append(
         Text(" ").join(
@@ -58,6 +83,11 @@ def _make_panel(plugin: Plugin) -> Panel:
 
     message.append(f"{HOMEPAGE}: ")
     message.append(_parse_homepage(plugin.homepage))
+    if repo is not None:
+        message.append(f"\n⭐{repo.stargazers_count}", "chartreuse1")
+        if repo.archived:
+            message.append(" ")
+            message.append(ARCHIVED, "reverse red")
     return Panel(
         message,
         title=f"[blue]{plugin.name}{'✅' if plugin.is_official else ''}[/blue]",
@@ -66,25 +96,189 @@ def _make_panel(plugin: Plugin) -> Panel:
     )
 
 
-def print_plugins(
-    plugins: List[Plugin], count: int = 10, page: int = 1
-) -> Tuple[int, List[Plugin]]:
-    page_ = page - 1
-    show_plugins = plugins[page_ * count : page * count]
+def _repo_key(repo: Optional[Repo]) -> Optional[Tuple[int, bool]]:
+    """What a panel shows of `repo`."""
+    return None if repo is None else (repo.stargazers_count, repo.archived)
 
-    pages, no_include_plugins = divmod(len(plugins), count)
-    pages = pages + bool(no_include_plugins)
-    console.print(
-        Columns(
-            (_make_panel(plugin) for plugin in show_plugins),
+
+class PluginPages:
+    """Pages of `plugins` for the store browser.
+
+    A page is laid out once per terminal width and GitHub statistics, and
+    the pages next to the shown one are rendered in the background, so
+    paging back and forth only writes out segments.
+    """
+
+    def __init__(
+        self, plugins: List[Plugin], count: int, disable_github: bool = False
+    ):
+        self.plugins = plugins
+        self.count = count
+        self.disable_github = disable_github
+        self.pages = max(1, -(-len(plugins) // count))
+        # (page, width, statistics) -> rendered page
+        self._rendered: Dict[Tuple[int, int, Hashable], Segments] = {}
+        # page -> rendering in the background
+        self._prefetch: Dict[int, "asyncio.Task[Segments]"] = {}
+        # (id of a plugin in `plugins`, statistics) -> panel
+        self._panels: Dict[Tuple[int, Hashable], Panel] = {}
+
+    def page_plugins(self, page: int) -> List[Plugin]:
+        return self.plugins[(page - 1) * self.count : page * self.count]
+
+    def _panel(self, plugin: Plugin, repo: Optional[Repo]) -> Panel:
+        key = (id(plugin), _repo_key(repo))
+        if (panel := self._panels.get(key)) is None:
+            panel = self._panels[key] = _make_panel(plugin, repo)
+        return panel
+
+    def _render(
+        self, page: int, width: int, stats: Dict[str, Repo]
+    ) -> Segments:
+        columns = Columns(
+            [
+                self._panel(
+                    plugin, stats.get(github_repo(plugin.homepage) or "")
+                )
+                for plugin in self.page_plugins(page)
+            ],
             align="center",
             title="NoneBot {store}({page}/{pages})".format(
-                store=_('Store'), page=page, pages=pages
+                store=_('Store'), page=page, pages=self.pages
             ),
-        ),
-        emoji=True,
+        )
+        with span("render.page", "render", page=page):
+            return Segments(
+                [*console.render(columns, console.options.update_width(width))]
+            )
+
+    async def _get(self, page: int) -> Segments:
+        # statistics are looked up every time, they may have arrived or
+        # changed since the page was rendered
+        stats: Dict[str, Repo] = (
+            {}
+            if self.disable_github
+            else await get_plugins_statistics(self.page_plugins(page))
+        )
+        key = (
+            page,
+            console.width,
+            tuple(sorted((name, _repo_key(r)) for name, r in stats.items())),
+        )
+        if (segments := self._rendered.get(key)) is None:
+            segments = self._rendered[key] = self._render(
+                page, console.width, stats
+            )
+        return segments
+
+    async def print(self, page: int) -> List[Plugin]:
+        """Print `page` and start rendering its neighbours."""
+        if (task := self._prefetch.pop(page, None)) is not None:
+            # its statistics are on the way, do not request them twice
+            await asyncio.wait([task])
+        console.print(await self._get(page))
+        for neighbour in (page + 1, page - 1):
+            if not 1 <= neighbour <= self.pages:
+                continue
+            if neighbour not in self._prefetch:
+                task = self._prefetch[neighbour] = asyncio.create_task(
+                    self._get(neighbour)
+                )
+                # a failed page is fetched again when it is shown
+                task.add_done_callback(
+                    lambda t: t.cancelled() or t.exception()
+                )
+        return self.page_plugins(page)
+
+    def close(self):
+        for task in self._prefetch.values():
+            task.cancel()
+        self._prefetch.clear()
+
+
+async def sort_plugins_by_stars(plugins: List[Plugin]) -> List[Plugin]:
+    """Most starred first, plugins without statistics last."""
+    stats = await get_plugins_statistics(plugins)
+
+    def _stars(plugin: Plugin) -> int:
+        repo = stats.get(github_repo(plugin.homepage) or "")
+        return -1 if repo is None else repo.stargazers_count
+
+    return sorted(plugins, key=_stars, reverse=True)
+
+
+def _title(plugin: Plugin, plugin_version: Optional[str]) -> str:
+    name = f"[blue]{plugin.name}{'✅' if plugin.is_official else ''}[/blue]"
+    if plugin_version:
+        return name + _(" (Installed [green]{}[/green])").format(
+            plugin_version
+        )
+    return name
+
+
+def _error_text(e: BaseException) -> Text:
+    return Text(f"\n\n[{e.__class__.__name__}] {str(e)}", style="red")
+
+
+def _pypi_section(pypi: Any, plugin_version: Optional[str]) -> Text:
+    if isinstance(pypi, BaseException):
+        return _error_text(pypi)
+    message = Text("\n\n🍱{}:\n".format(_('PyPI metadata')))
+    if pypi is LOADING:
+        message.append(LOADING, "grey50")
+        return message
+
+    version = Text("{}: ".format(_('Latest Version')))
+    version.append(
+        f"{pypi.version}{'⬆️' if plugin_version and plugin_version != pypi.version else ''}\n",  # noqa: E501
+        "chartreuse1",
     )
-    return pages, show_plugins
+    message.append(version)
+
+    if pypi.keywords:
+        keywords = Text("{}: ".format(_('Keywords')))
+        keywords.append(f"{pypi.keywords}\n", "chartreuse1")
+        message.append(keywords)
+
+    requires = Text("{}: ".format(_('Requires Python')))
+    requires.append(pypi.requires_python, "chartreuse1")
+    message.append(requires)
+    return message
+
+
+def _github_section(repo: Any) -> Text:
+    if isinstance(repo, BaseException):
+        return _error_text(repo)
+    message = Text("\n\n🐙{}\n".format(_('GitHub statistics')))
+    if repo is LOADING:
+        message.append(LOADING, "grey50")
+        return message
+
+    star = Text(f"Stars: {repo.stargazers_count}\n")
+    star.stylize("chartreuse1", 7)
+    message.append(star)
+
+    issues = Text(f"Issues/PRs: {repo.open_issues_count}\n")
+    issues.stylize("chartreuse1", 12)
+    message.append(issues)
+
+    forks = Text(f"Forks: {repo.forks_count}")
+    forks.stylize("chartreuse1", 7)
+    message.append(forks)
+
+    if repo.license:
+        license_ = Text("\nLicense: ")
+        license_.append(
+            f"{repo.license.name}({repo.license.spdx_id})",
+            "chartreuse1",
+        )
+        message.append(license_)
+    return message
+
+
+async def _get_installed_version(plugin: Plugin) -> Optional[str]:
+    await _init()
+    return get_plugin_version(plugin)
 
 
 async def print_plugin_detail(
@@ -92,10 +286,12 @@ async def print_plugin_detail(
     disable_github: bool,
     disable_pypi: bool,
 ):
-    # sourcery skip: use-fstring-for-concatenation, use-fstring-for-formatting
-    await _init()
-    plugin_version = get_version(plugin.module_name)
+    """Show the plugin, PyPI metadata and GitHub statistics.
 
+    The installed version, PyPI and GitHub are fetched concurrently, each
+    section is rendered as soon as its data lands. Cached data shows up
+    in the first frame.
+    """
     message = Text(
         plugin.desc,
         no_wrap=False,
@@ -125,122 +321,346 @@ async def print_plugin_detail(
     homepage.append(plugin.homepage, Style(link=plugin.homepage))
     message.append(homepage)
 
-    title = (
-        f"[blue]{plugin.name}{'✅' if plugin.is_official else ''}[/blue]"
-        + _(" (Installed [green]{}[/green])").format(  # noqa:W503
-            plugin_version
-        )
-        if plugin_version
-        else f"[blue]{plugin.name}{'✅' if plugin.is_official else ''}[/blue]"
-    )
-    with Live(
-        Panel(
-            message,
-            title=title,
-        )
-    ):
-        if not disable_pypi:
-            try:
-                pypi = await get_pypi_meta(plugin.project_link)
-                message.append("\n\n🍱{}:\n".format(_('PyPI metadata')))
-
-                version = Text("{}: ".format(_('Latest Version')))
-                version.append(
-                    f"{pypi.version}{'⬆️' if plugin_version and plugin_version != pypi.version else ''}\n",  # noqa: E501
-                    "chartreuse1",
-                )
-                message.append(version)
-
-                if pypi.keywords:
-                    keywords = Text("{}: ".format(_('Keywords')))
-                    keywords.append(f"{pypi.keywords}\n", "chartreuse1")
-                    message.append(keywords)
-
-                requires = Text("{}: ".format(_('Requires Python')))
-                requires.append(pypi.requires_python, "chartreuse1")
-                message.append(requires)
-            except Exception as e:
-                message.append(
-                    Text(f"\n\n[{e.__class__.__name__}] {str(e)}", style="red")
-                )
-
-        if not disable_github and (
-            match := re.match(REPO_REGEX_INCLUDE_PATH, plugin.homepage)
-        ):
-            try:
-                repo = await get_github_statistics(match[1])
-                message.append("\n\n🐙{}\n".format(_('GitHub statistics')))
-
-                star = Text(f"Stars: {repo.stargazers_count}\n")
-                star.stylize("chartreuse1", 7)
-                message.append(star)
-
-                issues = Text(f"Issues/PRs: {repo.open_issues_count}\n")
-                issues.stylize("chartreuse1", 12)
-                message.append(issues)
-
-                forks = Text(f"Forks: {repo.forks_count}")
-                forks.stylize("chartreuse1", 7)
-                message.append(forks)
-
-                if repo.license:
-                    license_ = Text("\nLicense: ")
-                    license_.append(
-                        f"{repo.license.name}({repo.license.spdx_id})",
-                        "chartreuse1",
-                    )
-                    message.append(license_)
-            except Exception as e:
-                message.append(
-                    Text(f"\n\n[{e.__class__.__name__}] {str(e)}", style="red")
+    repo_name = None if disable_github else github_repo(plugin.homepage)
+    # section -> data, an exception or `LOADING`
+    results: Dict[str, Any] = {"version": None}
+    pending: Dict[str, Awaitable[Any]] = {
+        "version": _get_installed_version(plugin)
+    }
+    if not disable_pypi:
+        results["pypi"] = get_cached_pypi_meta(plugin.project_link)
+        if results["pypi"] is None:
+            results["pypi"] = LOADING
+            pending["pypi"] = get_pypi_meta_retry(plugin.project_link)
+    if repo_name:
+        results["github"] = get_cached_github_statistics(repo_name)
+        if results["github"] is None:
+            results["github"] = LOADING
+            pending["github"] = get_github_statistics(repo_name)
+
+    def _render() -> Panel:
+        content = message.copy()
+        if "pypi" in results:
+            content.append(_pypi_section(results["pypi"], results["version"]))
+        if "github" in results:
+            content.append(_github_section(results["github"]))
+        return Panel(content, title=_title(plugin, results["version"]))
+
+    timeout = get_config().detail_timeout
+    tasks = {
+        asyncio.create_task(asyncio.wait_for(coro, timeout)): section
+        for section, coro in pending.items()
+    }
+    with Live(_render()) as live:
+        try:
+            while tasks:
+                done, _pending = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
                 )
+                for task in done:
+                    section = tasks.pop(task)
+                    exception = task.exception()
+                    if exception is None:
+                        results[section] = task.result()
+                    elif section != "version":
+                        results[section] = exception
+                with span("render.detail", "render"):
+                    live.update(_render(), refresh=True)
+        finally:
+            for task in tasks:
+                task.cancel()
 
 
 def print_markdown(markdown: str):
+    # markdown-it and pygments are only needed for a readme
+    from rich.markdown import Markdown
+
     console.print(Markdown(markdown, code_theme="github-dark"))
 
 
 def print_syntax(code: str):
+    from rich.syntax import Syntax
+
     console.print(Syntax(code, "reStructuredText"))
 
 
 async def install_plugin(
     plugins: List[Plugin], pypi_args: Optional[List[str]]
-):
-    proc = await call_pip_install(
-        [plugin.project_link for plugin in plugins], pypi_args
-    )
-    await proc.wait()
+) -> bool:
+    """Add `plugins` to the config and install them with one pip run.
+
+    The config is written once, then each plugin is pinned to a version
+    supporting the project's interpreter, see `pin_requirements`. The
+    config is restored if pip fails or is interrupted, pip's output is
+    printed as it goes.
+    """
+    plugins = [*{plugin.module_name: plugin for plugin in plugins}.values()]
+    if not plugins:
+        return True
+    try:
+        original = add_plugins_to_config(
+            plugin.module_name for plugin in plugins
+        )
+    except (RuntimeError, OSError) as e:
+        console.print(
+            _("Failed to add plugins to config: {e}").format(e=e),
+            style="red",
+        )
+        return False
+
+    returncode = None
+    try:
+        with console.status(_("Resolving packages...")):
+            requirements = await pin_requirements(plugins)
+        console.print(
+            _("Installing {requirements}").format(
+                requirements=" ".join(requirements)
+            ),
+            style="bold",
+        )
+        proc = await call_pip_install(
+            requirements,
+            pypi_args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        assert proc.stdout is not None
+        async for line in proc.stdout:
+            console.print(
+                line.decode(errors="replace").rstrip(),
+                style="grey50",
+                markup=False,
+                highlight=False,
+                soft_wrap=True,
+            )
+        returncode = await proc.wait()
+    finally:
+        if returncode != 0 and original is not None:
+            restore_config(original)
+    if returncode != 0:
+        console.print(
+            _("pip exited with code {code}").format(code=returncode),
+            style="red",
+        )
+        if original is not None:
+            console.print(_("The config is restored"), style="red")
+        return False
+    console.print(_("Installed successfully"), style="green")
+    return True
 
 
-async def print_dependencies_tree(plugins: List[Plugin]):
+async def print_dependencies_tree(
+    plugins: List[Plugin], include_all: bool = False
+):
     if not plugins:
         return
     await _init()
-    root = Tree(":open_file_folder: This Project")
+    graph = DependencyGraph(plugins, include_all)
+
+    def _update():
+        with span("render.tree", "render"):
+            live.update(graph.render(), refresh=True)
+
+    with Live(graph.render()) as live:
+        await graph.resolve(_update)
+
+
+def _update_status(update: PluginUpdate) -> Text:
+    if update.error is not None:
+        e = update.error
+        return Text(f"[{e.__class__.__name__}] {e}", style="red")
+    if update.installed is None:
+        return Text(_("not installed"), style="grey50")
+    if update.outdated:
+        return Text(f"{update.installed} → {update.latest}⬆️", style="yellow")
+    return Text(_("up to date"), style="green")
+
+
+async def print_outdated(plugins: List[Plugin]):
+    """Print each plugin as its latest version is known, then a summary."""
+    updates: Dict[int, PluginUpdate] = {}
+    async for update in check_updates(plugins):
+        updates[id(update.plugin)] = update
+        line = Text(f"{update.plugin.project_link} ", style="bold")
+        line.append(_update_status(update))
+        console.print(line)
+
+    outdated = sum(update.outdated for update in updates.values())
+    table = Table(
+        title=_("{outdated} of {count} plugins can be updated").format(
+            outdated=outdated, count=len(plugins)
+        )
+    )
+    table.add_column(PACKAGE, style="bold light_goldenrod3")
+    table.add_column(_("Installed"))
+    table.add_column(_("Latest"))
+    table.add_column(_("Status"))
+    for plugin in plugins:
+        update = updates[id(plugin)]
+        table.add_row(
+            plugin.project_link,
+            update.installed or "-",
+            update.latest or "-",
+            _update_status(update),
+        )
+    console.print(table)
 
-    async def _print(plugin: Plugin):
-        try:
-            pypi_metadata = await get_pypi_meta_retry(
-                plugin.project_link, time=2
-            )
-        except Exception as e:
-            tree = Tree(
-                Text(
-                    f"{plugin.project_link} "
-                    f"[{e.__class__.__name__}] {str(e)}",
-                    style="red",
-                )
-            )
-        else:
-            tree = await parse_depends_tree(
-                plugin,
-                pypi_metadata,
-                get_version(plugin.module_name),
-            )
-        root.add(tree)
 
-    with Live(root):
-        await asyncio.gather(
-            *[asyncio.create_task(_print(plugin)) for plugin in plugins]
+CHANGE_STYLES = {"added": "green", "updated": "yellow", "removed": "red"}
+CHANGE_SIGNS = {"added": "+", "updated": "~", "removed": "-"}
+
+
+def _format_time(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def print_store_changes(changes: StoreChanges):
+    """Table of added, updated and removed plugins.
+
+    Updated plugins show which fields changed, the others their
+    description.
+    """
+    table = Table(
+        title=_("{count} changes from {previous} to {now}").format(
+            count=len(changes.changes),
+            previous=_format_time(changes.previous_fetched_at),
+            now=_format_time(changes.fetched_at),
+        )
+    )
+    table.add_column("")
+    table.add_column(PACKAGE, style="bold light_goldenrod3")
+    table.add_column(_("Name"))
+    table.add_column(_("Details"))
+    for change in changes.changes:
+        plugin = change.plugin
+        table.add_row(
+            Text(CHANGE_SIGNS[change.kind], style=CHANGE_STYLES[change.kind]),
+            plugin.get("project_link"),
+            plugin.get("name"),
+            Text(", ".join(change.fields), style="yellow")
+            if change.kind == "updated"
+            else Text(plugin.get("desc", ""), style="grey50"),
+        )
+    console.print(table)
+
+
+async def print_warm(warmer: CacheWarmer) -> Dict[WarmStatus, int]:
+    """Progress bar of `warmer`, failures are printed as they happen.
+
+    Returns the count of each status.
+    """
+    counts = {status: 0 for status in WarmStatus}
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task(_("Warming the cache"), total=warmer.total)
+        async for result in warmer.run():
+            counts[result.status] += 1
+            progress.update(task, advance=1, total=warmer.total)
+            if result.status is WarmStatus.FAILED:
+                line = Text(f"{result.kind} {result.name}", style="bold")
+                if (e := result.error) is not None:
+                    line.append(f" [{e.__class__.__name__}] {e}", style="red")
+                progress.console.print(line)
+
+    console.print(
+        _(
+            "{fetched} fetched, {cached} already cached, "
+            "{failed} failed, {skipped} skipped"
+        ).format(**{status.value: count for status, count in counts.items()})
+    )
+    if counts[WarmStatus.SKIPPED]:
+        console.print(
+            _(
+                "The GitHub API rate limit is used up, "
+                "run again after the reset to fetch the rest."
+            ),
+            style="yellow",
         )
+    return counts
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+
+def print_profile(tracer: Tracer):
+    """Summary of the spans, requests and cache lookups of `tracer`.
+
+    Printed to stderr, so it never mixes with json output. Span times
+    include the spans nested in them.
+    """
+    err_console = Console(stderr=True)
+    wall = time.perf_counter() - tracer.origin
+
+    # name -> [count, total, max]
+    spans: Dict[str, List[float]] = {}
+    for span_ in tracer.spans:
+        duration = span_.end - span_.start
+        stat = spans.setdefault(span_.name, [0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += duration
+        stat[2] = max(stat[2], duration)
+    table = Table(
+        title=_("Phases ({wall} ms in total)").format(wall=_ms(wall))
+    )
+    table.add_column(_("Phase"), style="bold")
+    table.add_column(_("Count"), justify="right")
+    table.add_column(_("Total ms"), justify="right")
+    table.add_column(_("Max ms"), justify="right")
+    for name, (count, total, longest) in sorted(
+        spans.items(), key=lambda item: -item[1][1]
+    ):
+        table.add_row(name, str(count), _ms(total), _ms(longest))
+    err_console.print(table)
+
+    # host -> [count, bytes, total, max, status -> count]
+    hosts: Dict[str, List[Any]] = {}
+    for request in tracer.requests:
+        duration = request.end - request.start
+        stat = hosts.setdefault(request.host, [0, 0, 0.0, 0.0, {}])
+        stat[0] += 1
+        stat[1] += request.bytes
+        stat[2] += duration
+        stat[3] = max(stat[3], duration)
+        status = str(request.status or request.error)
+        stat[4][status] = stat[4].get(status, 0) + 1
+    if hosts:
+        table = Table(title=_("Requests"))
+        table.add_column(_("Host"), style="bold")
+        table.add_column(_("Count"), justify="right")
+        table.add_column(_("Status"))
+        table.add_column(_("Bytes"), justify="right")
+        table.add_column(_("Total ms"), justify="right")
+        table.add_column(_("Max ms"), justify="right")
+        for host, (count, size, total, longest, statuses) in hosts.items():
+            table.add_row(
+                host,
+                str(count),
+                " ".join(f"{s}×{n}" for s, n in sorted(statuses.items())),
+                str(size),
+                _ms(total),
+                _ms(longest),
+            )
+        err_console.print(table)
+
+    # kind -> status -> count
+    caches: Dict[str, Dict[str, int]] = {}
+    for event in tracer.cache_events:
+        counts = caches.setdefault(event.kind, {})
+        counts[event.status] = counts.get(event.status, 0) + 1
+    if caches:
+        table = Table(title=_("Cache"))
+        table.add_column(_("Cache"), style="bold")
+        for status in CacheStatus:
+            table.add_column(status.value, justify="right")
+        for kind, counts in caches.items():
+            table.add_row(
+                kind, *(str(counts.get(s.value, 0)) for s in CacheStatus)
+            )
+        err_console.print(table)
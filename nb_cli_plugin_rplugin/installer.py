@@ -1,10 +1,84 @@
-from typing import cast
+from importlib import import_module
+from typing import Any, List, Optional, cast
 
-from nb_cli.cli import CLIMainGroup, cli
+import click
+from nb_cli.cli import CLIMainGroup, ClickAliasedGroup, cli
 
-from .cli import rplugin
+from . import _
+
+
+class LazyGroup(ClickAliasedGroup):
+    """A group standing in for `import_path`, which is imported on use.
+
+    `nb` loads every plugin to build its own command list, so the
+    implementation (and rich, httpx and the like behind it) is only
+    imported when the group is actually invoked or listed.
+    """
+
+    def __init__(self, name: str, import_path: str, help: str, **kwargs):
+        self.import_path = import_path
+        self._help = help
+        self._group: Optional[click.Group] = None
+        super().__init__(name, **kwargs)
+
+    def _load(self) -> click.Group:
+        if self._group is None:
+            module, _, attr = self.import_path.partition(":")
+            self._group = getattr(import_module(module), attr)
+        return self._group
+
+    # set by `click.Command.__init__`, kept on the real group instead
+    @property
+    def help(self) -> str:
+        return _(self._help)
+
+    @help.setter
+    def help(self, value: Optional[str]):
+        pass
+
+    @property
+    def callback(self):
+        return self._load().callback
+
+    @callback.setter
+    def callback(self, value):
+        pass
+
+    @property
+    def params(self) -> List[click.Parameter]:
+        return self._load().params
+
+    @params.setter
+    def params(self, value):
+        pass
+
+    def make_context(
+        self,
+        info_name: Optional[str],
+        args: List[str],
+        parent: Optional[click.Context] = None,
+        **extra: Any,
+    ) -> click.Context:
+        return self._load().make_context(info_name, args, parent, **extra)
+
+    def invoke(self, ctx: click.Context) -> Any:
+        return self._load().invoke(ctx)
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return self._load().list_commands(ctx)
+
+    def get_command(
+        self, ctx: click.Context, cmd_name: str
+    ) -> Optional[click.Command]:
+        return self._load().get_command(ctx, cmd_name)
 
 
 def install():
     cli_ = cast(CLIMainGroup, cli)
-    cli_.add_command(rplugin)
+    cli_.add_command(
+        LazyGroup(
+            "rplugin",
+            "nb_cli_plugin_rplugin.cli:rplugin",
+            "Manage Bot Plugin with rich text.",
+        )
+    )
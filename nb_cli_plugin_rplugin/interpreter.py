@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import contextlib
+from typing import Dict, List, Iterable, Optional
+
+from pydantic import BaseModel
+from nb_cli.config import GLOBAL_CONFIG
+from nb_cli.handlers import get_default_python
+
+from .search import normalize_key
+from .tracing import span, cache_event
+from .storage import CacheEntry, CacheStatus, load_entry, save_entry
+
+INTERPRETER_CACHE = "interpreter/{}.json"
+# runs in the project's interpreter, so only the standard library is used
+PROBE_SCRIPT = """
+import os, sys, json, platform
+from importlib.metadata import distributions
+def read(dist):
+    # only the headers, parsing the whole METADATA with `email` is slow
+    text = dist.read_text("METADATA") or dist.read_text("PKG-INFO") or ""
+    headers = {"Name": "", "Version": ""}
+    requires = []
+    for line in text.splitlines():
+        if not line:
+            break
+        key, _, value = line.partition(": ")
+        if key == "Requires-Dist":
+            requires.append(value)
+        elif key in headers:
+            headers[key] = value
+    return {
+        "name": headers["Name"],
+        "version": headers["Version"],
+        # egg-info keeps them in requires.txt
+        "requires": requires or dist.requires or [],
+    }
+info = sys.implementation.version
+implementation_version = "{0.major}.{0.minor}.{0.micro}".format(info)
+if info.releaselevel != "final":
+    implementation_version += info.releaselevel[0] + str(info.serial)
+print(json.dumps({
+    "executable": sys.executable,
+    "prefix": sys.prefix,
+    "path": sys.path[1:],
+    "environment": {
+        "implementation_name": sys.implementation.name,
+        "implementation_version": implementation_version,
+        "os_name": os.name,
+        "platform_machine": platform.machine(),
+        "platform_release": platform.release(),
+        "platform_system": platform.system(),
+        "platform_version": platform.version(),
+        "python_full_version": platform.python_version(),
+        "platform_python_implementation": platform.python_implementation(),
+        "python_version": ".".join(platform.python_version_tuple()[:2]),
+        "sys_platform": sys.platform,
+    },
+    "distributions": [read(dist) for dist in distributions()],
+}))
+"""
+
+
+class InstalledDistribution(BaseModel):
+    name: str
+    version: str
+    requires: List[str] = []
+
+
+class ProbeResult(BaseModel):
+    executable: str
+    prefix: str
+    path: List[str]
+    environment: Dict[str, str]
+    """PEP 508 marker environment."""
+    distributions: List[InstalledDistribution]
+    mtimes: Dict[str, int] = {}
+    """Files the result depends on -> mtime, -1 if missing."""
+
+    def watched_paths(self) -> List[str]:
+        return [
+            self.executable,
+            os.path.join(self.prefix, "pyvenv.cfg"),
+            *self.path,
+        ]
+
+    def is_stale(self) -> bool:
+        return _mtimes(self.mtimes) != self.mtimes
+
+
+def _mtimes(paths: Iterable[str]) -> Dict[str, int]:
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = -1
+    return mtimes
+
+
+async def probe(python_path: str) -> ProbeResult:
+    """Run `PROBE_SCRIPT` in `python_path`."""
+    proc = await asyncio.create_subprocess_exec(
+        python_path,
+        "-W",
+        "ignore",
+        "-c",
+        PROBE_SCRIPT,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await proc.communicate()
+    result = ProbeResult.parse_raw(stdout.strip())
+    result.mtimes = _mtimes(result.watched_paths())
+    return result
+
+
+class Interpreter:
+    """The project's Python interpreter.
+
+    The probe result is kept on disk, keyed by the interpreter it was
+    launched as and the working directory, and reused until the
+    interpreter, its `pyvenv.cfg` or a directory on its `sys.path`
+    changes, e.g. after a plugin was installed.
+    """
+
+    def __init__(self, python_path: Optional[str] = None):
+        self.python_path = python_path
+        self.result: Optional[ProbeResult] = None
+        # normalized name -> distribution
+        self.distributions: Dict[str, InstalledDistribution] = {}
+
+    def _launcher(self) -> Optional[str]:
+        # what `get_default_python` would run, without running it
+        return (
+            self.python_path or GLOBAL_CONFIG.python or shutil.which("python")
+        )
+
+    def _cache_name(self, launcher: str) -> str:
+        key = json.dumps([launcher, os.getcwd()])
+        return INTERPRETER_CACHE.format(hashlib.sha1(key.encode()).hexdigest())
+
+    def _set(self, result: ProbeResult):
+        self.result = result
+        self.distributions = {}
+        for dist in result.distributions:
+            if dist.name:
+                # the first one on `sys.path` shadows the others
+                self.distributions.setdefault(normalize_key(dist.name), dist)
+
+    async def load(self) -> ProbeResult:
+        """Probe the interpreter unless a cached result is still valid."""
+        if self.result is not None and not self.result.is_stale():
+            return self.result
+
+        launcher = self._launcher()
+        if launcher is not None:
+            name = self._cache_name(launcher)
+            entry = load_entry(name)
+            with contextlib.suppress(ValueError):
+                if entry is not None:
+                    result = ProbeResult.parse_obj(entry.data)
+                    if not result.is_stale():
+                        cache_event("interpreter", CacheStatus.HIT.value, name)
+                        self._set(result)
+                        return result
+        else:
+            launcher = await get_default_python()
+            name = self._cache_name(launcher)
+
+        cache_event("interpreter", CacheStatus.MISS.value, name)
+        with span("interpreter.probe", "subprocess", python=launcher):
+            result = await probe(launcher)
+        save_entry(
+            name, CacheEntry(data=result.dict(), fetched_at=time.time())
+        )
+        self._set(result)
+        return result
+
+    @property
+    def environment(self) -> Optional[Dict[str, str]]:
+        return self.result.environment if self.result else None
+
+    def get_version(self, package: str) -> Optional[str]:
+        if dist := self.distributions.get(normalize_key(package)):
+            return dist.version
+
+
+_INTERPRETER: Optional[Interpreter] = None
+
+
+def get_interpreter() -> Interpreter:
+    global _INTERPRETER
+    if _INTERPRETER is None:
+        _INTERPRETER = Interpreter()
+    return _INTERPRETER
@@ -1,122 +1,385 @@
-import sys
-import json
+import os
 import asyncio
+import tempfile
 import contextlib
-from typing import List, Tuple, Iterable, Optional
-from importlib.metadata import (
-    PathDistribution,
-    DistributionFinder,
-    MetadataPathFinder,
-    version,
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Set,
+    Dict,
+    List,
+    Tuple,
+    Union,
+    Callable,
+    Iterable,
+    Optional,
+    AsyncIterator,
 )
 
 from rich.text import Text
 from rich.tree import Tree
-from nb_cli.handlers import get_default_python
+from nb_cli.config import GLOBAL_CONFIG
 
+from . import _
+from .tracing import span
+from .config import get_config
+from .interpreter import get_interpreter
+from .search import normalize_key, get_plugin_lookup
 from .meta import Plugin, PyPIPackage, get_plugins, get_pypi_meta_retry
 
+if TYPE_CHECKING:
+    from packaging.markers import Marker
+    from packaging.requirements import Requirement
+
 COLORS = ["bright_cyan", "bright_yellow", "green"]
-PLUGINS_DICT = {}
-FIRST = True
+# i18n
+CYCLE = _("(cycle)")
+SHOWN_ABOVE = _("(shown above)")
 
 
-class ProjectFinder(MetadataPathFinder):
-    def __new__(cls, path: List[str]):
-        cls.path = path
-        return super().__new__(cls)
+async def _init(python_path: Optional[str] = None):
+    """Probe the project's interpreter, see `Interpreter.load`."""
+    interpreter = get_interpreter()
+    if python_path is not None and python_path != interpreter.python_path:
+        interpreter.python_path = python_path
+        interpreter.result = None
+    with span("interpreter.load"):
+        await interpreter.load()
 
-    @classmethod
-    def find_distributions(
-        cls, context: DistributionFinder.Context = ...
-    ) -> Iterable[PathDistribution]:
-        vars(context)["path"] = cls.path
-        return super().find_distributions(context)
 
+def get_version(package: str) -> Optional[str]:
+    return get_interpreter().get_version(package)
 
-async def _init(python_path: Optional[str] = None):
-    global FIRST
-    if not FIRST:
-        return
-    FIRST = False
-    if python_path is None:
-        python_path = await get_default_python()
-    proc = await asyncio.create_subprocess_exec(
-        python_path,
-        "-W",
-        "ignore",
-        "-c",
-        "import sys,json;print(json.dumps(sys.path[1:]))",
-        stdout=asyncio.subprocess.PIPE,
+
+def get_plugin_version(plugin: Plugin) -> Optional[str]:
+    """Installed version of `plugin`, by distribution or module name."""
+    return get_version(plugin.project_link) or get_version(plugin.module_name)
+
+
+def is_newer(latest: str, installed: str) -> bool:
+    from packaging.version import Version, InvalidVersion
+
+    try:
+        return Version(latest) > Version(installed)
+    except InvalidVersion:
+        return latest != installed
+
+
+class PluginUpdate:
+    """Installed and latest version of a plugin."""
+
+    def __init__(
+        self,
+        plugin: Plugin,
+        installed: Optional[str],
+        latest: Optional[str] = None,
+        error: Optional[Exception] = None,
+    ):
+        self.plugin = plugin
+        self.installed = installed
+        self.latest = latest
+        self.error = error
+
+    @property
+    def outdated(self) -> bool:
+        if self.installed is None or self.latest is None:
+            return False
+        return is_newer(self.latest, self.installed)
+
+
+async def check_updates(
+    plugins: Iterable[Plugin],
+) -> AsyncIterator[PluginUpdate]:
+    """Look up the latest version of all `plugins` at once.
+
+    At most `concurrency` requests run at the same time, results are
+    yielded in completion order.
+    """
+    await _init()
+    semaphore = asyncio.Semaphore(get_config().concurrency)
+
+    async def _check(plugin: Plugin) -> PluginUpdate:
+        installed = get_plugin_version(plugin)
+        async with semaphore:
+            try:
+                meta = await get_pypi_meta_retry(plugin.project_link)
+            except Exception as e:
+                return PluginUpdate(plugin, installed, error=e)
+        return PluginUpdate(plugin, installed, meta.version)
+
+    for future in asyncio.as_completed([_check(plugin) for plugin in plugins]):
+        yield await future
+
+
+def python_supported(requires_python: Optional[str]) -> bool:
+    """Whether the project's interpreter satisfies `requires_python`."""
+    from packaging.specifiers import SpecifierSet, InvalidSpecifier
+
+    environment = get_interpreter().environment or {}
+    if not requires_python or "python_full_version" not in environment:
+        return True
+    try:
+        specifiers = SpecifierSet(requires_python)
+    except InvalidSpecifier:
+        return True
+    return specifiers.contains(
+        environment["python_full_version"], prereleases=True
     )
-    stdout, _ = await proc.communicate()
-    sys.meta_path.append(ProjectFinder(json.loads(stdout.strip())))
 
 
-def get_version(package: str) -> Optional[str]:
-    with contextlib.suppress(ImportError):
-        return version(package)
-
-
-async def parse_depends_tree(
-    plugin: Plugin,
-    pypi_meta: Optional[PyPIPackage] = None,
-    plugin_ver: Optional[str] = None,
-    _deep: int = 0,
-) -> Tree:
-    async def _add_dependencies(plugin: Plugin, dependency: str):
-        dependency_meta = await get_pypi_meta_retry(dependency)
-        dependencies.append((plugin, dependency_meta))
-
-    global PLUGINS_DICT
-
-    now_ver = pypi_meta.version if pypi_meta else None
-    plugins = await get_plugins()
-    if not PLUGINS_DICT:
-        PLUGINS_DICT = {i.project_link: i for i in plugins}
-    plugins = PLUGINS_DICT
-
-    color = COLORS[_deep] if _deep <= 2 else COLORS[_deep - 3]
-    if not pypi_meta:
-        return Tree(f"[{color}]{plugin.project_link}[/{color}]")
-
-    dependencies: List[Tuple[Plugin, PyPIPackage]] = []
-    tasks = []
-    for require in pypi_meta.requires_dist or []:
-        dependency = require.split(maxsplit=1)[0]
-        if i := plugins.get(dependency):
-            tasks.append(_add_dependencies(i, dependency))
+def dependencies_installed(meta: PyPIPackage) -> bool:
+    """Whether the installed distributions satisfy the requirements of
+    `meta`, dependencies that are not installed yet are not checked."""
+    for requirement in meta.requires_dist or []:
+        dependency = parse_requirement(requirement)
+        if dependency is None or not marker_applies(dependency.marker):
+            continue
+        installed = get_version(dependency.name)
+        if installed is not None and not dependency.specifier.contains(
+            installed, prereleases=True
+        ):
+            return False
+    return True
+
+
+async def pin_requirements(plugins: Iterable[Plugin]) -> List[str]:
+    """Requirements to install `plugins` with, in the same order.
+
+    PyPI metadata is revalidated for all plugins at once, and a plugin is
+    pinned to its latest version if that supports the project's
+    interpreter and its installed dependencies. Otherwise, or if the
+    metadata cannot be fetched, it is left to pip to choose a version.
+    """
+    await _init()
+    semaphore = asyncio.Semaphore(get_config().concurrency)
+
+    async def _pin(plugin: Plugin) -> str:
+        async with semaphore:
+            try:
+                meta = await get_pypi_meta_retry(
+                    plugin.project_link, fresh=True
+                )
+            except Exception:
+                return plugin.project_link
+        if not python_supported(meta.requires_python):
+            return plugin.project_link
+        if not dependencies_installed(meta):
+            return plugin.project_link
+        return f"{plugin.project_link}=={meta.version}"
+
+    return await asyncio.gather(*(_pin(plugin) for plugin in plugins))
+
+
+def _write_config(content: str):
+    """Replace the config file at once, it is never left half written."""
+    file = GLOBAL_CONFIG.file.resolve()
+    fd, tmp = tempfile.mkstemp(dir=file.parent, suffix=".tmp")
     try:
-        await asyncio.gather(*tasks)
-    except Exception as e:
-        return Tree(
-            Text(
-                f"{plugin.project_link} " f"[{e.__class__.__name__}] {str(e)}",
+        with os.fdopen(fd, "w", encoding=GLOBAL_CONFIG.encoding) as f:
+            f.write(content)
+        with contextlib.suppress(OSError):
+            os.chmod(tmp, file.stat().st_mode & 0o777)
+        os.replace(tmp, file)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def add_plugins_to_config(module_names: Iterable[str]) -> Optional[str]:
+    """Add `module_names` to the project's plugins in a single write.
+
+    Returns the previous content of the config file for `restore_config`,
+    or `None` if there was nothing to add.
+    """
+    if not GLOBAL_CONFIG.file.is_file():
+        raise RuntimeError("Config file not found!")
+    original = GLOBAL_CONFIG.file.read_text(encoding=GLOBAL_CONFIG.encoding)
+    data = GLOBAL_CONFIG._get_data()
+    assert data is not None
+    table: Dict[str, Any] = data.setdefault("tool", {}).setdefault(
+        "nonebot", {}
+    )
+    plugins: List[str] = table.setdefault("plugins", [])
+    added = False
+    for module_name in module_names:
+        if module_name not in plugins:
+            plugins.append(module_name)
+            added = True
+    if not added:
+        return None
+    _write_config(data.as_string())
+    return original
+
+
+def restore_config(content: str):
+    _write_config(content)
+
+
+def parse_requirement(requirement: str) -> Optional["Requirement"]:
+    # only the dependency tree needs packaging
+    from packaging.requirements import Requirement, InvalidRequirement
+
+    with contextlib.suppress(InvalidRequirement):
+        return Requirement(requirement)
+
+
+def marker_applies(
+    marker: Optional["Marker"], extras: Iterable[str] = ()
+) -> bool:
+    """Evaluate `marker` for the project's interpreter.
+
+    A dependency applies if its marker holds without extras or with any
+    of the `extras` its dependent was required with.
+    """
+    if marker is None:
+        return True
+    environment = get_interpreter().environment or {}
+    return any(
+        marker.evaluate({**environment, "extra": extra})
+        for extra in ("", *extras)
+    )
+
+
+class DependencyGraph:
+    """Dependencies between store plugins, resolved level by level.
+
+    Each package is fetched once per run however many plugins depend on
+    it, and a level is fetched concurrently, so resolving takes as many
+    rounds as the graph is deep. Dependencies whose markers do not hold
+    for the project's interpreter are skipped, and so are packages that
+    are not in the store unless `include_all` is set.
+    """
+
+    def __init__(self, plugins: Iterable[Plugin], include_all: bool = False):
+        self.include_all = include_all
+        # normalized package name -> ...
+        self.names: Dict[str, str] = {}
+        self.plugins: Dict[str, Plugin] = {}
+        self.extras: Dict[str, Set[str]] = {}
+        self.metas: Dict[str, Union[PyPIPackage, Exception]] = {}
+        self.dependencies: Dict[str, List[str]] = {}
+        self.roots = [
+            key
+            for plugin in plugins
+            if (key := self._add(plugin.project_link, plugin))
+        ]
+
+    def _add(self, name: str, plugin: Optional[Plugin]) -> Optional[str]:
+        """Add a node, return its key if it is new."""
+        key = normalize_key(name)
+        if key in self.names:
+            return None
+        self.names[key] = plugin.project_link if plugin else name
+        if plugin is not None:
+            self.plugins[key] = plugin
+        self.extras[key] = set()
+        return key
+
+    async def resolve(self, on_level: Optional[Callable[[], None]] = None):
+        """Fetch the whole graph below the roots.
+
+        `on_level` is called after every level, e.g. to redraw the tree.
+        """
+        lookup = get_plugin_lookup(await get_plugins())
+        semaphore = asyncio.Semaphore(get_config().concurrency)
+
+        async def _fetch(key: str):
+            async with semaphore:
+                try:
+                    self.metas[key] = await get_pypi_meta_retry(
+                        self.names[key], time=2
+                    )
+                except Exception as e:
+                    self.metas[key] = e
+
+        level = self.roots
+        depth = 0
+        while level:
+            with span("tree.level", depth=depth, packages=len(level)):
+                await asyncio.gather(*(_fetch(key) for key in level))
+            depth += 1
+            next_level: List[str] = []
+            for key in level:
+                dependencies = self.dependencies[key] = []
+                meta = self.metas[key]
+                if isinstance(meta, Exception):
+                    continue
+                for require in meta.requires_dist or []:
+                    requirement = parse_requirement(require)
+                    if requirement is None or not marker_applies(
+                        requirement.marker, self.extras[key]
+                    ):
+                        continue
+                    plugin = lookup.get_by_project(requirement.name)
+                    if plugin is None and not self.include_all:
+                        continue
+                    dependency_key = normalize_key(requirement.name)
+                    if dependency_key not in dependencies:
+                        dependencies.append(dependency_key)
+                    if new := self._add(requirement.name, plugin):
+                        next_level.append(new)
+                    # extras of packages resolved already are not followed
+                    self.extras[dependency_key] |= requirement.extras
+            level = next_level
+            if on_level is not None:
+                on_level()
+
+    def _label(self, key: str, depth: int) -> Union[str, Text]:
+        name = self.names[key]
+        plugin = self.plugins.get(key)
+        meta = self.metas.get(key)
+        if isinstance(meta, Exception):
+            return Text(
+                f"{name} " f"[{meta.__class__.__name__}] {meta}",
                 style="red",
             )
-        )
 
-    content = [f"[{color}]{plugin.project_link}[/{color}]"]
-    if plugin_ver:
-        if now_ver:
-            if plugin_ver == now_ver:
-                content.append(f" ([bold]{plugin_ver}[/bold])")
-            else:
-                content.append(
-                    f" ([bold]{plugin_ver}[/bold] [green]{now_ver}⬆️[/green])"
-                )
-        else:
-            content.append(f" ({plugin_ver})")
-    if _deep == 0:
-        content.append(f" {plugin.desc}")
-    tree = Tree("".join(content))
-    for dependency, pypi in dependencies:
-        tree.add(
-            await parse_depends_tree(
-                dependency,
-                pypi,
-                get_version(dependency.module_name),
-                _deep=_deep + 1,
-            )
+        # packages not in the store are dimmed
+        color = COLORS[depth % len(COLORS)] if plugin else "grey50"
+        content = [f"[{color}]{name}[/{color}]"]
+        now_ver = meta.version if meta else None
+        plugin_ver = (
+            get_plugin_version(plugin) if plugin else get_version(name)
         )
-    return tree
+        if plugin_ver:
+            if now_ver:
+                if plugin_ver == now_ver:
+                    content.append(f" ([bold]{plugin_ver}[/bold])")
+                else:
+                    content.append(
+                        f" ([bold]{plugin_ver}[/bold] [green]{now_ver}⬆️[/green])"  # noqa: E501
+                    )
+            else:
+                content.append(f" ({plugin_ver})")
+        if depth == 0 and plugin:
+            content.append(f" {plugin.desc}")
+        return "".join(content)
+
+    def render(self) -> Tree:
+        """Tree of what is resolved so far.
+
+        A package is expanded at its first appearance only, later ones
+        refer to it, and a package depending on one of its ancestors is
+        marked as a cycle.
+        """
+        root = Tree(":open_file_folder: This Project")
+        expanded: Set[str] = set()
+
+        def _add(parent: Tree, key: str, path: Tuple[str, ...]):
+            label = self._label(key, len(path))
+            if key in path:
+                parent.add(f"{label} [red]{CYCLE}[/red]")
+                return
+            dependencies = self.dependencies.get(key)
+            if dependencies and key in expanded:
+                parent.add(f"{label} [grey50]{SHOWN_ABOVE}[/grey50]")
+                return
+            tree = parent.add(label)
+            expanded.add(key)
+            for dependency in dependencies or ():
+                _add(tree, dependency, (*path, key))
+
+        for key in self.roots:
+            _add(root, key, ())
+        return root
@@ -1,18 +1,69 @@
-from typing import TYPE_CHECKING, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import operator
+import contextlib
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Set,
+    Dict,
+    List,
+    Tuple,
+    Iterable,
+    Optional,
+)
 
 import httpx
 from nb_cli import cache
-from pydantic import BaseModel
 from nb_cli.exceptions import ModuleLoadFailed
-
-from .exception import PluginNotFoundError
+from pydantic import BaseModel, ValidationError
+
+from .client import get_client
+from .config import get_config
+from .tracing import span, cache_event
+from .exception import OfflineError, RateLimitedError
+from .resilience import with_retry, is_transient, status_error
+from .search import normalize_key, get_search_index, get_plugin_lookup
+from .storage import (
+    CacheEntry,
+    CacheStatus,
+    load_json,
+    save_json,
+    load_entry,
+    save_entry,
+)
+from .github import (
+    GITHUB_CACHE,
+    GRAPHQL_BATCH,
+    build_query,
+    github_repo,
+    get_rate_limit,
+    github_headers,
+    parse_response,
+    is_rate_limited,
+)
 
 URLS = [
     "https://v2.nonebot.dev/plugins.json",
     "https://raw.fastgit.org/nonebot/nonebot2/master/website/static/plugins.json",  # noqa: E501
     "https://cdn.jsdelivr.net/gh/nonebot/nonebot2/website/static/plugins.json",
 ]
+STORE_CACHE = "store/plugins.json"
+PYPI_CACHE_DIR = "pypi"
+PYPI_CACHE = PYPI_CACHE_DIR + "/{}.json"
+PYPI_DESCRIPTION_CACHE = PYPI_CACHE_DIR + "/{}.description.json"
+# keep reading the rest of a JSON response after `info` if it is at most
+# this many bytes, so that the connection can be reused
+PYPI_DRAIN_LIMIT = 64 * 1024
+_PYPI_INFO_START = re.compile(r'\s*\{\s*"info"\s*:\s*')
+MIRRORS_CACHE = "store/mirrors.json"
+STORE_CHANGES_CACHE = "store/changes.json"
+STORE_CACHE_STATUS: Optional[CacheStatus] = None
+_background_tasks: Set["asyncio.Task[None]"] = set()
 
 
 class Tag(BaseModel):
@@ -20,7 +71,9 @@ class Tag(BaseModel):
     color: str
 
 
-class Plugin(BaseModel):
+class PluginSchema(BaseModel):
+    """An item of the store index, see `Plugin`."""
+
     module_name: str
     project_link: str
     name: str
@@ -31,6 +84,239 @@ class Plugin(BaseModel):
     is_official: bool
 
 
+_STR_FIELDS = (
+    "module_name",
+    "project_link",
+    "name",
+    "desc",
+    "author",
+    "homepage",
+)
+_get_str_fields = operator.itemgetter(*_STR_FIELDS)
+# (label, color) -> the tag shared by every plugin having it
+_TAGS: Dict[Tuple[str, str], Tag] = {}
+
+
+def _shared_tag(label: str, color: str) -> Tag:
+    if (tag := _TAGS.get((label, color))) is None:
+        tag = _TAGS[(label, color)] = Tag.construct(
+            label=sys.intern(label), color=sys.intern(color)
+        )
+    return tag
+
+
+class _Tags:
+    """`Plugin.tags`, validated when first read."""
+
+    def __set_name__(self, owner: type, name: str):
+        self.slot = getattr(owner, f"_{name}")
+        self.field = PluginSchema.__fields__[name]
+
+    def __get__(
+        self, plugin: Optional["Plugin"], owner: type
+    ) -> Tuple[Tag, ...]:
+        if plugin is None:
+            return self  # type: ignore
+        value = self.slot.__get__(plugin, owner)
+        if type(value) is not tuple:
+            value = self._validate(value)
+            self.slot.__set__(plugin, value)
+        return value
+
+    def _validate(self, value: Any) -> Tuple[Tag, ...]:
+        tags: List[Tag] = []
+        with contextlib.suppress(TypeError, KeyError):
+            for item in value:
+                key = item["label"], item["color"]
+                if (tag := _TAGS.get(key)) is None:
+                    if type(key[0]) is not str or type(key[1]) is not str:
+                        break
+                    tag = _shared_tag(*key)
+                tags.append(tag)
+            else:
+                return tuple(tags)
+        value, errors = self.field.validate(value, {}, loc="tags")
+        if errors:
+            raise ValidationError([errors], PluginSchema)
+        return tuple(_shared_tag(tag.label, tag.color) for tag in value)
+
+
+class Plugin:
+    """A plugin of the store.
+
+    `decode` skips pydantic for the usual well-formed store index, plain
+    fields only get a type check and tags are validated when first read.
+    Tags and authors are shared between plugins.
+    """
+
+    __slots__ = (*_STR_FIELDS, "_tags", "is_official")
+
+    module_name: str
+    project_link: str
+    name: str
+    desc: str
+    author: str
+    homepage: str
+    tags = _Tags()
+    is_official: bool
+
+    def __init__(self, **fields: Any):
+        for name in _STR_FIELDS:
+            setattr(self, name, fields[name])
+        self._tags = fields["tags"]
+        self.is_official = fields["is_official"]
+
+    @classmethod
+    def decode(cls, items: List[Dict[str, Any]]) -> List["Plugin"]:
+        """Plugins of a store index.
+
+        Items failing the type checks are validated by `PluginSchema`,
+        raising `ValidationError` if invalid.
+        """
+        new = cls.__new__
+        intern = sys.intern
+        plugins = []
+        for item in items:
+            try:
+                values = _get_str_fields(item)
+                tags = item["tags"]
+                is_official = item["is_official"]
+            except (TypeError, KeyError):
+                plugins.append(cls.parse_obj(item))
+                continue
+            types = set(map(type, values))
+            if types != {str} or type(is_official) is not bool:
+                plugins.append(cls.parse_obj(item))
+                continue
+            plugin = new(cls)
+            (
+                plugin.module_name,
+                plugin.project_link,
+                plugin.name,
+                plugin.desc,
+                author,
+                plugin.homepage,
+            ) = values
+            plugin.author = intern(author)
+            plugin._tags = tags
+            plugin.is_official = is_official
+            plugins.append(plugin)
+        return plugins
+
+    @classmethod
+    def parse_obj(cls, item: Any) -> "Plugin":
+        """Validate all fields at once."""
+        return cls(**PluginSchema.parse_obj(item).dict())
+
+    def dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in PluginSchema.__fields__}
+        data["tags"] = [tag.dict() for tag in self.tags]
+        return data
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Plugin):
+            return NotImplemented
+        return self.dict() == other.dict()
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"Plugin(module_name={self.module_name!r})"
+
+
+_ITEM_ENCODER = json.JSONEncoder(
+    ensure_ascii=False, check_circular=False, sort_keys=True
+)
+
+
+def _item_hash(item: Any) -> str:
+    return hashlib.blake2b(
+        _ITEM_ENCODER.encode(item).encode(), digest_size=16
+    ).hexdigest()
+
+
+def validate_index(
+    items: List[Any], previous: Optional[CacheEntry] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Validate a store index from a mirror, returns (data, hashes).
+
+    Each raw item is hashed, and items `previous` has validated already
+    are reused, so a refresh only validates new or changed items.
+    """
+    known: Dict[str, Dict[str, Any]] = {}
+    if previous is not None and previous.hashes is not None:
+        known = dict(zip(previous.hashes, previous.data))
+    data = []
+    hashes = []
+    for item in items:
+        digest = _item_hash(item)
+        if (validated := known.get(digest)) is None:
+            validated = PluginSchema.parse_obj(item).dict()
+        data.append(validated)
+        hashes.append(digest)
+    return data, hashes
+
+
+class StoreChange(BaseModel):
+    kind: str
+    """`added`, `updated` or `removed`."""
+    plugin: Dict[str, Any]
+    """The plugin after the change, or before it if it was removed."""
+    fields: List[str] = []
+    """Fields which changed, only for `updated`."""
+
+
+class StoreChanges(BaseModel):
+    """What changed in the store index between two refreshes."""
+
+    fetched_at: float
+    previous_fetched_at: float
+    changes: List[StoreChange]
+
+
+def diff_store(previous: CacheEntry, current: CacheEntry) -> StoreChanges:
+    """Compare two store indexes by package and module name."""
+
+    def _keyed(data: List[Dict[str, Any]]):
+        return {
+            (item.get("project_link"), item.get("module_name")): item
+            for item in data
+        }
+
+    before, after = _keyed(previous.data), _keyed(current.data)
+    changes = []
+    for key, item in after.items():
+        if (old := before.get(key)) is None:
+            changes.append(StoreChange(kind="added", plugin=item))
+        elif old != item:
+            changes.append(
+                StoreChange(
+                    kind="updated",
+                    plugin=item,
+                    fields=[
+                        name for name in item if old.get(name) != item[name]
+                    ],
+                )
+            )
+    changes.extend(
+        StoreChange(kind="removed", plugin=item)
+        for key, item in before.items()
+        if key not in after
+    )
+    return StoreChanges(
+        fetched_at=current.fetched_at,
+        previous_fetched_at=previous.fetched_at,
+        changes=changes,
+    )
+
+
+def get_store_changes() -> Optional[StoreChanges]:
+    """Changes of the last refresh which fetched a new store index."""
+    if (data := load_json(STORE_CHANGES_CACHE)) is not None:
+        with contextlib.suppress(ValidationError):
+            return StoreChanges.parse_obj(data)
+
+
 class RepoLicense(BaseModel):
     name: str
     spdx_id: str
@@ -46,7 +332,8 @@ class Repo(BaseModel):
 
 
 class PyPIPackage(BaseModel):
-    description: str
+    description: Optional[str] = None
+    """Only loaded by `get_pypi_description`."""
     description_content_type: Optional[str] = None
     keywords: str
     version: str
@@ -54,6 +341,188 @@ class PyPIPackage(BaseModel):
     requires_dist: Optional[List[str]] = None
 
 
+class MirrorStats(BaseModel):
+    latency: Optional[float] = None
+    """Moving average of successful response time in seconds."""
+    failures: int = 0
+    """Consecutive failures, reset by a success."""
+
+    def record_success(self, elapsed: float) -> None:
+        self.failures = 0
+        self.latency = (
+            elapsed
+            if self.latency is None
+            else self.latency * 0.7 + elapsed * 0.3
+        )
+
+    def record_slow(self, elapsed: float) -> None:
+        # a cancelled loser was at least this slow, it did not succeed so
+        # its failures are kept
+        if self.latency is None or elapsed > self.latency:
+            self.latency = elapsed
+
+    def record_failure(self) -> None:
+        self.failures += 1
+
+
+def _load_mirror_stats() -> Dict[str, MirrorStats]:
+    data = load_json(MIRRORS_CACHE)
+    if not isinstance(data, dict):
+        return {}
+    stats = {}
+    for url, item in data.items():
+        with contextlib.suppress(ValueError):
+            stats[url] = MirrorStats.parse_obj(item)
+    return stats
+
+
+def rank_mirrors(
+    mirrors: List[str], stats: Dict[str, MirrorStats]
+) -> List[str]:
+    """Order mirrors by failures, then by historical latency.
+
+    Mirrors without history keep their configured order after the
+    known-good ones.
+    """
+
+    def _key(item: Tuple[int, str]):
+        index, url = item
+        stat = stats.get(url) or MirrorStats()
+        latency = float("inf") if stat.latency is None else stat.latency
+        return stat.failures, latency, index
+
+    return [url for _, url in sorted(enumerate(mirrors), key=_key)]
+
+
+async def _fetch_store(
+    entry: Optional[CacheEntry],
+) -> Tuple[CacheEntry, CacheStatus]:
+    """Race the mirrors, the first valid response wins.
+
+    Mirrors are started one by one in ranked order, each one after
+    `store_hedge_delay` seconds or as soon as the previous one failed.
+    Losers are cancelled when a winner is found.
+    """
+    config = get_config()
+    stats = _load_mirror_stats()
+    mirrors = rank_mirrors(config.store_mirrors or URLS, stats)
+    exceptions: List[Exception] = []
+    started: Dict["asyncio.Task[Tuple[CacheEntry, CacheStatus]]", float] = {}
+    # losers were at least as slow as the winner
+    winner_elapsed = 0.0
+
+    async def _fetch(url: str) -> Tuple[CacheEntry, CacheStatus]:
+        resp = await get_client(url).get(
+            url, headers=entry.conditional_headers(url) if entry else None
+        )
+        if entry and resp.status_code == httpx.codes.NOT_MODIFIED:
+            entry.fetched_at = time.time()
+            return entry, CacheStatus.REVALIDATED
+        if resp.status_code != httpx.codes.OK:
+            raise status_error(
+                f"Store index status error: {resp.status_code}", resp
+            )
+        data = resp.json()
+        if not isinstance(data, list):
+            raise ValueError(f"Invalid store index from {url}")
+        # validated once here, so the cached index is decoded without it
+        with span("store.validate", "decode", url=url):
+            data, hashes = validate_index(data, entry)
+        return (
+            CacheEntry(
+                data=data,
+                hashes=hashes,
+                fetched_at=time.time(),
+                url=url,
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            ),
+            CacheStatus.MISS,
+        )
+
+    def _start(url: str) -> "asyncio.Task[Tuple[CacheEntry, CacheStatus]]":
+        # the race itself is the retry, only the circuit breaker and the
+        # deadline apply to a single mirror
+        task = asyncio.create_task(with_retry(lambda: _fetch(url), url, 0))
+        tasks[task] = url
+        started[task] = time.perf_counter()
+        return task
+
+    tasks: Dict["asyncio.Task[Tuple[CacheEntry, CacheStatus]]", str] = {}
+    pending = {_start(url) for url in mirrors[:1]}
+    waiting = mirrors[1:]
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=config.store_hedge_delay if waiting else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                url = tasks[task]
+                elapsed = time.perf_counter() - started[task]
+                if exception := task.exception():
+                    stats.setdefault(url, MirrorStats()).record_failure()
+                    exceptions.append(exception)
+                    continue
+                stats.setdefault(url, MirrorStats()).record_success(elapsed)
+                winner_elapsed = elapsed
+                return task.result()
+            if waiting:
+                # hedge: the previous mirror failed or is too slow
+                pending.add(_start(waiting.pop(0)))
+    finally:
+        for task in pending:
+            task.cancel()
+            stats.setdefault(tasks[task], MirrorStats()).record_slow(
+                max(time.perf_counter() - started[task], winner_elapsed)
+            )
+        await asyncio.gather(*pending, return_exceptions=True)
+        save_json(
+            MIRRORS_CACHE,
+            {url: stat.dict() for url, stat in stats.items()},
+        )
+
+    raise ModuleLoadFailed("Failed to get plugins list.", exceptions)
+
+
+async def _refresh_store(
+    entry: Optional[CacheEntry],
+) -> Tuple[CacheEntry, CacheStatus]:
+    previous = entry
+    with span("store.fetch", "network") as fetch_span:
+        entry, status = await _fetch_store(entry)
+        fetch_span.set(url=entry.url, status=status.value)
+    if previous is not None and status is CacheStatus.MISS:
+        save_json(STORE_CHANGES_CACHE, diff_store(previous, entry).dict())
+    save_entry(STORE_CACHE, entry)
+    return entry, status
+
+
+async def refresh_store() -> CacheStatus:
+    """Revalidate the store index now, whatever its age."""
+    if get_config().offline:
+        raise OfflineError("Store index is not refreshed while offline.")
+    _, status = await _refresh_store(load_entry(STORE_CACHE))
+    return status
+
+
+def _revalidate_in_background(entry: CacheEntry) -> None:
+    task = asyncio.create_task(_refresh_store(entry))
+    _background_tasks.add(task)
+    # the stale copy is already served, a failed revalidation is not an error
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def wait_background_tasks() -> None:
+    """Let a pending revalidation finish before the clients are closed."""
+    if _background_tasks:
+        await asyncio.wait(
+            _background_tasks, timeout=get_config().revalidate_timeout
+        )
+
+
 if TYPE_CHECKING:
 
     async def get_plugins() -> List[Plugin]:
@@ -63,91 +532,377 @@ else:
 
     @cache(ttl=None)
     async def get_plugins() -> List[Plugin]:
-        exceptions: List[Exception] = []
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            tasks = [executor.submit(httpx.get, url) for url in URLS]
-
-            for future in as_completed(tasks):
-                try:
-                    resp = future.result()
-                    items = resp.json()
-                    return [Plugin.parse_obj(item) for item in items]
-                except Exception as e:
-                    exceptions.append(e)
-
-        raise ModuleLoadFailed("Failed to get plugins list.", exceptions)
+        global STORE_CACHE_STATUS
+        config = get_config()
+        entry = load_entry(STORE_CACHE)
+
+        if entry is not None and (
+            config.offline or entry.age < config.store_ttl
+        ):
+            STORE_CACHE_STATUS = CacheStatus.HIT
+        elif config.offline:
+            raise OfflineError("Store index is not cached.")
+        elif entry is not None and (
+            entry.age < config.store_ttl + config.store_stale_ttl
+        ):
+            STORE_CACHE_STATUS = CacheStatus.STALE
+            _revalidate_in_background(entry)
+        else:
+            try:
+                entry, STORE_CACHE_STATUS = await _refresh_store(entry)
+            except ModuleLoadFailed:
+                if entry is None:
+                    raise
+                STORE_CACHE_STATUS = CacheStatus.STALE
+
+        cache_event("store", STORE_CACHE_STATUS.value, STORE_CACHE)
+        with span("store.decode", "decode", count=len(entry.data)):
+            return Plugin.decode(entry.data)
 
 
 def search_plugins(plugins: List[Plugin], query: str) -> List[Plugin]:
-    return [
-        plugin
-        for plugin in plugins
-        if any(
-            query in value
-            for key, value in plugin.dict().items()
-            if key in {"name", "module_name", "desc", "project_link"}
-        )
-    ]
+    return get_search_index(plugins).search(query)
 
 
 def get_plugin_by_name(name: str, plugins: List[Plugin]) -> Plugin:
-    if exact_packages := [
-        p for p in plugins if name in {p.name, p.module_name, p.project_link}
-    ]:
-        return exact_packages[0]
-    elif packages := [
-        p
-        for p in plugins
-        if name in p.name or name in p.module_name or name in p.project_link
-    ]:
-        return packages[0]
-    else:
-        raise PluginNotFoundError
+    return get_plugin_lookup(plugins).resolve(name)
+
+
+def get_plugins_by_names(
+    names: Iterable[str], plugins: List[Plugin]
+) -> Tuple[Dict[str, Plugin], Dict[str, Exception]]:
+    return get_plugin_lookup(plugins).resolve_many(names)
+
+
+def get_cached_github_statistics(repo: str) -> Optional[Repo]:
+    """Statistics of `repo` from disk if they need no revalidation."""
+    entry = load_entry(GITHUB_CACHE.format(repo.lower()))
+    if entry is not None and entry.is_fresh(get_config().github_ttl):
+        return Repo.parse_obj(entry.data)
 
 
 async def get_github_statistics(repo: str) -> Repo:
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            f"https://api.github.com/repos/{repo}", follow_redirects=True
+    """Statistics of `repo`, cached and within the API rate limit.
+
+    Expired entries are revalidated with `If-None-Match`, a 304 does not
+    count against the limit. While the limit is used up, the cached entry
+    is served however old it is.
+    """
+    config = get_config()
+    key = GITHUB_CACHE.format(repo.lower())
+    entry = load_entry(key)
+    if entry is not None and entry.is_fresh(config.github_ttl):
+        cache_event("github", CacheStatus.HIT.value, repo)
+        return Repo.parse_obj(entry.data)
+    if config.offline:
+        raise OfflineError(f"GitHub statistics of {repo} is not cached.")
+
+    rate_limit = get_rate_limit()
+    if not rate_limit.allow(refresh=entry is not None):
+        if entry is not None:
+            cache_event("github", CacheStatus.STALE.value, repo)
+            return Repo.parse_obj(entry.data)
+        raise RateLimitedError(rate_limit.reset)
+
+    url = f"{config.github_api_url}/repos/{repo}"
+
+    async def _fetch() -> Repo:
+        headers = github_headers()
+        if entry is not None:
+            headers.update(entry.conditional_headers(url))
+        resp = await get_client(url).get(url, headers=headers)
+        rate_limit.update(resp)
+        if entry is not None and resp.status_code == httpx.codes.NOT_MODIFIED:
+            cache_event("github", CacheStatus.REVALIDATED.value, repo)
+            entry.fetched_at = time.time()
+            save_entry(key, entry)
+            return Repo.parse_obj(entry.data)
+        if is_rate_limited(resp):
+            raise RateLimitedError(rate_limit.reset)
+        if resp.status_code != httpx.codes.OK:
+            # error pages of proxies and outages are not JSON
+            message = resp.reason_phrase
+            with contextlib.suppress(ValueError, KeyError, TypeError):
+                message = resp.json()["message"]
+            raise status_error(
+                f"GitHub API error: {message}({resp.status_code})", resp
+            )
+        cache_event("github", CacheStatus.MISS.value, repo)
+        result = Repo.parse_obj(resp.json())
+        save_entry(
+            key,
+            CacheEntry(
+                data=result.dict(),
+                fetched_at=time.time(),
+                url=url,
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            ),
         )
-        data = resp.json()
+        return result
+
+    try:
+        with span("github.statistics", "network", repo=repo):
+            return await with_retry(_fetch, url)
+    except Exception as e:
+        if entry is None or not (
+            isinstance(e, RateLimitedError) or is_transient(e)
+        ):
+            raise
+        return Repo.parse_obj(entry.data)
+
+
+async def get_github_statistics_many(repos: Iterable[str]) -> Dict[str, Repo]:
+    """Statistics of many repositories, `GRAPHQL_BATCH` per request.
+
+    Missing and expired entries are fetched with one GraphQL query per
+    batch and merged into the cache. The GraphQL API needs a token,
+    without one only cached statistics are returned. Repositories that
+    could not be fetched are left out, this never raises.
+    """
+    config = get_config()
+    result: Dict[str, Repo] = {}
+    # repositories to fetch -> whether they are cached
+    pending: Dict[str, bool] = {}
+    for repo in dict.fromkeys(repos):
+        entry = load_entry(GITHUB_CACHE.format(repo.lower()))
+        if entry is not None:
+            result[repo] = Repo.parse_obj(entry.data)
+            if entry.is_fresh(config.github_ttl):
+                cache_event("github", CacheStatus.HIT.value, repo)
+                continue
+        pending[repo] = entry is not None
+    if not pending or config.offline or not config.github_token:
+        return result
+
+    url = f"{config.github_api_url}/graphql"
+    rate_limit = get_rate_limit("graphql")
+    semaphore = asyncio.Semaphore(4)
+
+    async def _request(batch: List[str]) -> Dict[str, Any]:
+        resp = await get_client(url).post(
+            url, json=build_query(batch), headers=github_headers()
+        )
+        rate_limit.update(resp)
+        if is_rate_limited(resp):
+            raise RateLimitedError(rate_limit.reset)
         if resp.status_code != httpx.codes.OK:
-            raise RuntimeError(
-                f"GitHub API error: {data['message']}({resp.status_code})"
+            raise status_error(
+                f"GitHub GraphQL API status error: {resp.status_code}", resp
+            )
+        body = resp.json()
+        if not isinstance(body, dict):
+            raise ValueError(f"Invalid GraphQL response: {body!r}")
+        # an error payload has `errors` and no or `null` data
+        data = body.get("data")
+        return data if isinstance(data, dict) else {}
+
+    async def _fetch(batch: List[str]) -> None:
+        async with semaphore:
+            if not rate_limit.allow(refresh=all(pending[r] for r in batch)):
+                return
+            try:
+                with span("github.graphql", "network", repos=len(batch)):
+                    data = await with_retry(lambda: _request(batch), url)
+            except (
+                httpx.HTTPError,
+                asyncio.TimeoutError,
+                RuntimeError,
+                ValueError,
+            ):
+                # keep whatever is cached
+                return
+        now = time.time()
+        for repo, node in parse_response(batch, data):
+            if node is None:
+                continue
+            try:
+                stats = Repo.parse_obj(node)
+            except ValueError:
+                continue
+            cache_event("github", CacheStatus.MISS.value, repo)
+            result[repo] = stats
+            save_entry(
+                GITHUB_CACHE.format(repo.lower()),
+                CacheEntry(data=result[repo].dict(), fetched_at=now),
             )
-        return Repo.parse_obj(data)
+
+    repos_ = [*pending]
+    await asyncio.gather(
+        *(
+            _fetch(repos_[i : i + GRAPHQL_BATCH])
+            for i in range(0, len(repos_), GRAPHQL_BATCH)
+        )
+    )
+    return result
+
+
+async def get_plugins_statistics(plugins: Iterable[Plugin]) -> Dict[str, Repo]:
+    """Statistics of the GitHub homepages of `plugins`, by `owner/name`."""
+    return await get_github_statistics_many(
+        repo for plugin in plugins if (repo := github_repo(plugin.homepage))
+    )
+
+
+def get_cached_pypi_meta(package: str) -> Optional[PyPIPackage]:
+    """PyPI metadata from disk if it needs no revalidation."""
+    entry = load_entry(PYPI_CACHE.format(normalize_key(package)))
+    if entry is not None and entry.is_fresh(get_config().pypi_ttl):
+        return PyPIPackage.parse_obj(entry.data)
 
 
 if TYPE_CHECKING:
 
-    async def get_pypi_meta(package: str) -> PyPIPackage:
+    async def get_pypi_meta(
+        package: str, fresh: bool = False, retries: Optional[int] = None
+    ) -> PyPIPackage:
         ...
 
 else:
 
     @cache(ttl=None)
-    async def get_pypi_meta(package: str) -> PyPIPackage:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"https://pypi.org/pypi/{package}/json", follow_redirects=True
+    async def get_pypi_meta(
+        package: str, fresh: bool = False, retries: Optional[int] = None
+    ) -> PyPIPackage:
+        # `fresh` revalidates a cached entry whatever its age, the cache is
+        # read before `with_retry` so that it is served even when the
+        # circuit is open or the deadline has passed
+        config = get_config()
+        key = PYPI_CACHE.format(normalize_key(package))
+        entry = load_entry(key)
+        if not fresh and entry is not None and entry.is_fresh(config.pypi_ttl):
+            cache_event("pypi", CacheStatus.HIT.value, package)
+            return PyPIPackage.parse_obj(entry.data)
+        if config.offline:
+            raise OfflineError(f"PyPI metadata of {package} is not cached.")
+
+        url = f"{config.pypi_url}/{package}/json"
+
+        async def _fetch() -> PyPIPackage:
+            async with get_client(url).stream(
+                "GET",
+                url,
+                headers=entry.conditional_headers(url) if entry else None,
+            ) as resp:
+                last_serial = resp.headers.get("X-PyPI-Last-Serial")
+                serial = int(last_serial) if last_serial else None
+                not_modified = resp.status_code == httpx.codes.NOT_MODIFIED
+                same_serial = entry is not None and entry.serial == serial
+                if entry is not None and (
+                    not_modified or serial and same_serial
+                ):
+                    # unchanged since last fetch, skip reading the body
+                    cache_event("pypi", CacheStatus.REVALIDATED.value, package)
+                    entry.fetched_at = time.time()
+                    save_entry(key, entry)
+                    return PyPIPackage.parse_obj(entry.data)
+                if resp.status_code != httpx.codes.OK:
+                    raise status_error(
+                        f"PyPI JSON API status error: {resp.status_code}",
+                        resp,
+                    )
+                with span("pypi.read_info", "decode", package=package):
+                    info = await _read_pypi_info(resp)
+
+            cache_event("pypi", CacheStatus.MISS.value, package)
+            return _save_pypi_info(package, info, resp, serial)
+
+        return await with_retry(_fetch, url, retries)
+
+
+def _save_pypi_info(
+    package: str,
+    info: Dict[str, Any],
+    resp: httpx.Response,
+    serial: Optional[int],
+) -> PyPIPackage:
+    name = normalize_key(package)
+    now = time.time()
+    # the description is only needed by the README viewer, keep it apart
+    # so that the tree never has to load it
+    save_entry(
+        PYPI_DESCRIPTION_CACHE.format(name),
+        CacheEntry(data=info.get("description") or "", fetched_at=now),
+    )
+    data = {
+        field: info.get(field)
+        for field in PyPIPackage.__fields__
+        if field != "description"
+    }
+    save_entry(
+        PYPI_CACHE.format(name),
+        CacheEntry(
+            data=data,
+            fetched_at=now,
+            url=str(resp.url),
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+            serial=serial,
+        ),
+    )
+    return PyPIPackage.parse_obj(data)
+
+
+async def _read_pypi_info(resp: httpx.Response) -> Dict[str, Any]:
+    """Decode `info` and stop reading before `releases` and `urls`.
+
+    Those hold every file of every version and are by far the biggest
+    part of the document for popular projects.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    info: Optional[Dict[str, Any]] = None
+    async for chunk in resp.aiter_text():
+        if info is not None:
+            # draining a short remainder
+            continue
+        buffer += chunk
+        if match := _PYPI_INFO_START.match(buffer):
+            with contextlib.suppress(ValueError):
+                info = decoder.raw_decode(buffer, match.end())[0]
+                # an unknown length may be anything, do not drain it
+                length = int(resp.headers.get("Content-Length", -1))
+                if length < 0:
+                    break
+                if length - resp.num_bytes_downloaded > PYPI_DRAIN_LIMIT:
+                    break
+    if info is None:
+        # `info` is not the first key, fall back to a full decode
+        info = json.loads(buffer)["info"]
+    return info
+
+
+async def get_pypi_meta_with_description(package: str) -> PyPIPackage:
+    """Like `get_pypi_meta`, but with `description` loaded."""
+    pypi = await get_pypi_meta(package)
+    key = PYPI_DESCRIPTION_CACHE.format(normalize_key(package))
+    if entry := load_entry(key):
+        return pypi.copy(update={"description": entry.data})
+    if get_config().offline:
+        raise OfflineError(f"Description of {package} is not cached.")
+
+    url = f"{get_config().pypi_url}/{package}/json"
+
+    async def _fetch() -> httpx.Response:
+        resp = await get_client(url).get(url)
+        if resp.status_code != httpx.codes.OK:
+            raise status_error(
+                f"PyPI JSON API status error: {resp.status_code}", resp
             )
-            if resp.status_code != httpx.codes.OK:
-                raise RuntimeError(
-                    f"PyPI JSON API status error: {resp.status_code}"
-                )
-            return PyPIPackage.parse_obj(resp.json()["info"])
-
-
-async def get_pypi_meta_retry(package: str, time: int = 3) -> PyPIPackage:
-    times = 0
-    if times > time:
-        raise RuntimeError(f"Retried too many times for {package}")
-    while True:
-        try:
-            return await get_pypi_meta(package)
-        except Exception as e:
-            if isinstance(e, RuntimeError) and e.args[0] == (  # noqa: W503
-                "PyPI JSON API status error: 404"
-            ):  # noqa: W503
-                raise
-            times += 1
+        return resp
+
+    resp = await with_retry(_fetch, url)
+    last_serial = resp.headers.get("X-PyPI-Last-Serial")
+    info = resp.json()["info"]
+    pypi = _save_pypi_info(
+        package, info, resp, int(last_serial) if last_serial else None
+    )
+    return pypi.copy(update={"description": info.get("description") or ""})
+
+
+async def get_pypi_meta_retry(
+    package: str, time: int = 3, fresh: bool = False
+) -> PyPIPackage:
+    """`get_pypi_meta` with at most `time` retries of transient failures."""
+    with span("pypi.meta", "network", package=package):
+        return await get_pypi_meta(package, fresh, time)
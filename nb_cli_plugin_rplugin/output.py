@@ -0,0 +1,262 @@
+import json
+import asyncio
+from typing import Any, Set, Dict, List, Optional, Awaitable
+
+import click
+
+from .config import get_config
+from .github import GRAPHQL_BATCH, github_repo
+from .manager import (
+    DependencyGraph,
+    _init,
+    get_version,
+    check_updates,
+    get_plugin_version,
+)
+from .meta import (
+    Repo,
+    Plugin,
+    PyPIPackage,
+    StoreChanges,
+    get_pypi_meta_retry,
+    get_github_statistics,
+    get_plugins_statistics,
+)
+
+FORMATS = ["text", "json", "ndjson"]
+
+
+class RecordWriter:
+    """Machine readable output, without rich or prompts.
+
+    `ndjson` writes each record as soon as it is ready, `json` collects
+    them into one array written at the end.
+    """
+
+    def __init__(self, format: str):
+        self.format = format
+        self.records: List[Dict[str, Any]] = []
+
+    def write(self, record: Dict[str, Any]):
+        if self.format == "ndjson":
+            click.echo(json.dumps(record, ensure_ascii=False))
+        else:
+            self.records.append(record)
+
+    def dump(self, document: Any):
+        click.echo(json.dumps(document, ensure_ascii=False, indent=2))
+
+    def close(self):
+        if self.format == "json":
+            self.dump(self.records)
+
+
+def _error(e: BaseException) -> Dict[str, str]:
+    return {"type": e.__class__.__name__, "message": str(e)}
+
+
+def _pypi(meta: PyPIPackage) -> Dict[str, Any]:
+    # the readme is only loaded for `info`, and huge
+    return meta.dict(exclude={"description", "description_content_type"})
+
+
+def _github(repo: Optional[Repo]) -> Optional[Dict[str, Any]]:
+    return repo.dict() if repo else None
+
+
+async def write_plugins(
+    plugins: List[Plugin],
+    format: str,
+    disable_github: bool = False,
+    with_pypi: bool = False,
+):
+    """Write each plugin with its GitHub statistics and PyPI metadata.
+
+    Statistics are fetched by GraphQL batch and PyPI metadata with at
+    most `concurrency` requests at once, a plugin is written as soon as
+    both are in, so `ndjson` lines are in completion order.
+    """
+    semaphore = asyncio.Semaphore(get_config().concurrency)
+    batches: Dict[int, "asyncio.Future[Dict[str, Repo]]"] = {}
+
+    async def _record(index: int, plugin: Plugin) -> Dict[str, Any]:
+        record = plugin.dict()
+        if not disable_github:
+            batch = index // GRAPHQL_BATCH
+            if batch not in batches:
+                start = batch * GRAPHQL_BATCH
+                batches[batch] = asyncio.ensure_future(
+                    get_plugins_statistics(
+                        plugins[start : start + GRAPHQL_BATCH]
+                    )
+                )
+            stats = await batches[batch]
+            record["github"] = _github(
+                stats.get(github_repo(plugin.homepage) or "")
+            )
+        if with_pypi:
+            async with semaphore:
+                try:
+                    meta = await get_pypi_meta_retry(plugin.project_link)
+                except Exception as e:
+                    record["pypi"] = None
+                    record["pypi_error"] = _error(e)
+                else:
+                    record["pypi"] = _pypi(meta)
+        return record
+
+    writer = RecordWriter(format)
+    coros = [_record(index, plugin) for index, plugin in enumerate(plugins)]
+    if format == "ndjson":
+        for coro in asyncio.as_completed(coros):
+            writer.write(await coro)
+    else:
+        for record in await asyncio.gather(*coros):
+            writer.write(record)
+    writer.close()
+
+
+async def _installed(plugin: Plugin) -> Optional[str]:
+    await _init()
+    return get_plugin_version(plugin)
+
+
+async def write_plugin_detail(
+    plugin: Plugin,
+    format: str,
+    disable_github: bool = False,
+    disable_pypi: bool = False,
+):
+    """Like `print_plugin_detail`.
+
+    `ndjson` writes the plugin first, then a `{"section": ...}` record for
+    each of `installed_version`, `pypi` and `github` as it lands, `json`
+    writes one object with all of them.
+    """
+    pending: Dict[str, Awaitable[Any]] = {
+        "installed_version": _installed(plugin)
+    }
+    if not disable_pypi:
+        pending["pypi"] = get_pypi_meta_retry(plugin.project_link)
+    if not disable_github and (repo := github_repo(plugin.homepage)):
+        pending["github"] = get_github_statistics(repo)
+
+    writer = RecordWriter(format)
+    detail = plugin.dict()
+    if format == "ndjson":
+        writer.write(detail)
+
+    timeout = get_config().detail_timeout
+    tasks = {
+        asyncio.create_task(asyncio.wait_for(coro, timeout)): section
+        for section, coro in pending.items()
+    }
+    try:
+        while tasks:
+            done, _pending = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                section = tasks.pop(task)
+                record: Dict[str, Any] = {"section": section, "data": None}
+                if (exception := task.exception()) is not None:
+                    record["error"] = _error(exception)
+                elif section == "pypi":
+                    record["data"] = _pypi(task.result())
+                elif section == "github":
+                    record["data"] = _github(task.result())
+                else:
+                    record["data"] = task.result()
+                if format == "ndjson":
+                    writer.write(record)
+                else:
+                    detail[section] = record["data"]
+                    if "error" in record:
+                        detail[f"{section}_error"] = record["error"]
+    finally:
+        for task in tasks:
+            task.cancel()
+    if format == "json":
+        writer.dump(detail)
+
+
+async def write_dependencies_tree(
+    plugins: List[Plugin], format: str, include_all: bool = False
+):
+    """Write a record for each package of the dependency graph.
+
+    Packages are written level by level as they are resolved, each once
+    with the keys of its dependencies, roots have `depth` 0.
+    """
+    writer = RecordWriter(format)
+    if not plugins:
+        writer.close()
+        return
+    await _init()
+    graph = DependencyGraph(plugins, include_all)
+    written: Set[str] = set()
+    depth = 0
+
+    def _write_level():
+        nonlocal depth
+        for key, dependencies in graph.dependencies.items():
+            if key in written:
+                continue
+            written.add(key)
+            plugin = graph.plugins.get(key)
+            meta = graph.metas.get(key)
+            record: Dict[str, Any] = {
+                "name": graph.names[key],
+                "key": key,
+                "depth": depth,
+                "module_name": plugin.module_name if plugin else None,
+                "version": None,
+                "installed_version": get_plugin_version(plugin)
+                if plugin
+                else get_version(graph.names[key]),
+                "dependencies": dependencies,
+            }
+            if isinstance(meta, Exception):
+                record["error"] = _error(meta)
+            elif meta is not None:
+                record["version"] = meta.version
+            writer.write(record)
+        depth += 1
+
+    await graph.resolve(_write_level)
+    writer.close()
+
+
+async def write_outdated(plugins: List[Plugin], format: str):
+    """Write the versions of each plugin, see `check_updates`."""
+    writer = RecordWriter(format)
+    records: Dict[int, Dict[str, Any]] = {}
+    async for update in check_updates(plugins):
+        record: Dict[str, Any] = {
+            "module_name": update.plugin.module_name,
+            "project_link": update.plugin.project_link,
+            "installed_version": update.installed,
+            "latest_version": update.latest,
+            "outdated": update.outdated,
+        }
+        if update.error is not None:
+            record["error"] = _error(update.error)
+        if format == "ndjson":
+            writer.write(record)
+        records[id(update.plugin)] = record
+    if format == "json":
+        writer.dump([records[id(plugin)] for plugin in plugins])
+
+
+def write_store_changes(changes: Optional[StoreChanges], format: str):
+    """Write the changes of the last refresh.
+
+    `json` writes the whole `StoreChanges`, `null` if none are recorded,
+    `ndjson` a record for each change.
+    """
+    writer = RecordWriter(format)
+    if format == "json":
+        writer.dump(changes.dict() if changes else None)
+        return
+    for change in changes.changes if changes else ():
+        writer.write(change.dict())
@@ -0,0 +1,169 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Dict, TypeVar, Callable, Optional, Awaitable
+
+import httpx
+
+from .config import get_config
+from .exception import (
+    StatusError,
+    OfflineError,
+    CircuitOpenError,
+    DeadlineExceededError,
+)
+
+T = TypeVar("T")
+
+_DEADLINE: Optional[float] = None
+
+
+def start_deadline() -> None:
+    """Start the overall deadline of the running command."""
+    global _DEADLINE
+    if (deadline := get_config().deadline) > 0:
+        _DEADLINE = time.monotonic() + deadline
+
+
+def remaining_time() -> Optional[float]:
+    return None if _DEADLINE is None else _DEADLINE - time.monotonic()
+
+
+class CircuitBreaker:
+    """Fail fast for a host after too many consecutive transient failures.
+
+    After `cooldown` seconds one trial request is let through, its outcome
+    closes the circuit again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.trial = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.trial or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.trial = False
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    if (breaker := _BREAKERS.get(host)) is None:
+        config = get_config()
+        breaker = _BREAKERS[host] = CircuitBreaker(
+            config.circuit_threshold, config.circuit_cooldown
+        )
+    return breaker
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def status_error(message: str, resp: httpx.Response) -> StatusError:
+    return StatusError(
+        message,
+        resp.status_code,
+        parse_retry_after(resp.headers.get("Retry-After")),
+    )
+
+
+def is_transient(exception: BaseException) -> bool:
+    """Whether trying again may succeed."""
+    if isinstance(exception, StatusError):
+        return exception.status_code in {
+            httpx.codes.REQUEST_TIMEOUT,
+            httpx.codes.TOO_MANY_REQUESTS,
+        } or (exception.status_code >= 500)
+    if isinstance(exception, (OfflineError, ValueError)):
+        # ValueError covers invalid JSON and failed validation
+        return False
+    return isinstance(exception, (httpx.TransportError, asyncio.TimeoutError))
+
+
+async def with_retry(
+    func: Callable[[], Awaitable[T]],
+    url: str,
+    retries: Optional[int] = None,
+) -> T:
+    """Call `func`, which requests `url`, until it succeeds.
+
+    Transient failures are retried at most `retries` times (default from
+    config) with exponential backoff and full jitter, or after the
+    `Retry-After` the server asked for. Permanent failures, an open
+    circuit of the host or the command deadline stop immediately.
+    """
+    config = get_config()
+    if retries is None:
+        retries = config.retries
+    host = httpx.URL(url).host
+    breaker = get_breaker(host)
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Too many failures for {host}, skipped")
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f"Deadline exceeded for {url}")
+        try:
+            result = await asyncio.wait_for(func(), remaining)
+        except asyncio.CancelledError:
+            # a cancelled trial tells nothing about the host
+            breaker.trial = False
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and remaining is not None:
+                if (left := remaining_time()) is not None and left <= 0:
+                    breaker.trial = False
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded for {url}"
+                    ) from e
+            if not is_transient(e):
+                # the host answered, it is not down
+                breaker.record_success()
+                raise
+            delay = random.uniform(
+                0, min(config.backoff_max, config.backoff_base * 2**attempt)
+            )
+            if isinstance(e, StatusError) and e.retry_after is not None:
+                delay = max(0.0, e.retry_after)
+            remaining = remaining_time()
+            out_of_time = remaining is not None and delay >= remaining
+            # a failed trial is not retried
+            if attempt >= retries or out_of_time or breaker.trial:
+                # one failure per request however often it was tried
+                breaker.record_failure()
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
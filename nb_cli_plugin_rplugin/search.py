@@ -0,0 +1,289 @@
+import re
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Set, Dict, List, Tuple, Iterable, Optional
+
+from .exception import PluginNotFoundError, AmbiguousPluginError
+
+if TYPE_CHECKING:
+    from .meta import Plugin
+
+# (field, weight), a match in an identifying field outranks one in `desc`
+FIELDS = (
+    ("name", 3),
+    ("module_name", 3),
+    ("project_link", 3),
+    ("author", 2),
+    ("tags", 2),
+    ("desc", 1),
+)
+KEY_FIELDS = ("name", "module_name", "project_link")
+
+# score tiers, see `SearchIndex.search`
+EXACT = 1000
+PREFIX = 100
+TOKEN = 10
+TOKEN_PREFIX = 6
+SUBSTRING = 4
+FUZZY = 1
+
+_TOKEN_REGEX = re.compile(r"[^\W_]+")
+_SEPARATOR_REGEX = re.compile(r"[-_.\s]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_REGEX.findall(text.casefold())
+
+
+def normalize_key(text: str) -> str:
+    """Normalize an identifier like PEP 503 does for project names."""
+    return _SEPARATOR_REGEX.sub("-", text.strip()).casefold()
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f" {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance of `a` and `b` is at most `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def _field_values(plugin: "Plugin", field: str) -> Iterable[str]:
+    if field == "tags":
+        return (tag.label for tag in plugin.tags)
+    return (getattr(plugin, field),)
+
+
+class SearchIndex:
+    """Inverted index over a store snapshot.
+
+    Tokens are case folded and split on anything that is not a letter or
+    a digit, so `nonebot_plugin_weather` is found by `weather`.
+    """
+
+    def __init__(self, plugins: List["Plugin"]):
+        self.plugins = plugins
+        # token -> {plugin index: best field weight}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # normalized key field -> plugin indexes
+        self.keys: Dict[str, Set[int]] = {}
+        for index, plugin in enumerate(plugins):
+            self.add(index, plugin)
+        self._prepare()
+
+    def add(self, index: int, plugin: "Plugin") -> None:
+        for field, weight in FIELDS:
+            for value in _field_values(plugin, field):
+                for token in tokenize(value):
+                    docs = self.postings.setdefault(token, {})
+                    if docs.get(index, 0) < weight:
+                        docs[index] = weight
+        for field in KEY_FIELDS:
+            key = normalize_key(getattr(plugin, field))
+            self.keys.setdefault(key, set()).add(index)
+
+    def _prepare(self) -> None:
+        self.vocabulary = sorted(self.postings)
+        self.sorted_keys = sorted(self.keys)
+        self.trigrams: Dict[str, Set[str]] = {}
+        for token in self.vocabulary:
+            for gram in _trigrams(token):
+                self.trigrams.setdefault(gram, set()).add(token)
+
+    def _prefixed(self, sorted_words: List[str], prefix: str) -> Iterable[str]:
+        for i in range(bisect_left(sorted_words, prefix), len(sorted_words)):
+            if not sorted_words[i].startswith(prefix):
+                break
+            yield sorted_words[i]
+
+    def _substring_tokens(self, term: str) -> Iterable[str]:
+        if len(term) < 3:
+            return (token for token in self.vocabulary if term in token)
+        grams = [
+            self.trigrams.get(term[i : i + 3], set())
+            for i in range(len(term) - 2)
+        ]
+        candidates = set.intersection(*sorted(grams, key=len))
+        return (token for token in candidates if term in token)
+
+    def _fuzzy_tokens(self, term: str) -> Iterable[str]:
+        if len(term) < 4:
+            return ()
+        limit = 1 if len(term) < 8 else 2
+        candidates: Set[str] = set()
+        for gram in _trigrams(term):
+            candidates |= self.trigrams.get(gram, set())
+        return (
+            token
+            for token in candidates
+            if _within_distance(term, token, limit)
+        )
+
+    def _match_term(self, term: str) -> Dict[int, int]:
+        scores: Dict[int, int] = {}
+        seen: Set[str] = set()
+
+        def _collect(tokens: Iterable[str], tier: int) -> None:
+            # tiers are collected from high to low, a token only counts once
+            for token in tokens:
+                if token in seen:
+                    continue
+                seen.add(token)
+                for index, weight in self.postings[token].items():
+                    if scores.get(index, 0) < tier * weight:
+                        scores[index] = tier * weight
+
+        _collect([term] if term in self.postings else [], TOKEN)
+        _collect(self._prefixed(self.vocabulary, term), TOKEN_PREFIX)
+        _collect(self._substring_tokens(term), SUBSTRING)
+        if not scores:
+            _collect(self._fuzzy_tokens(term), FUZZY)
+        return scores
+
+    def search(self, query: str) -> List["Plugin"]:
+        """Every term must match, results are ranked by relevance.
+
+        A query equal to a name, module name or package name ranks
+        first, then those that are a prefix of one, then the summed
+        per-term score: whole token > token prefix > substring > typo.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        unique_terms = list(dict.fromkeys(terms))
+        scores = self._match_term(unique_terms[0])
+        for term in unique_terms[1:]:
+            if not scores:
+                break
+            term_scores = self._match_term(term)
+            scores = {
+                index: score + term_scores[index]
+                for index, score in scores.items()
+                if index in term_scores
+            }
+        if not scores:
+            return []
+
+        key = normalize_key(query)
+        for index in self.keys.get(key, ()):
+            if index in scores:
+                scores[index] += EXACT
+        for prefixed in self._prefixed(self.sorted_keys, key):
+            if prefixed != key:
+                for index in self.keys[prefixed] & scores.keys():
+                    scores[index] += PREFIX
+
+        ranked: List[Tuple[int, int]] = sorted(
+            scores.items(), key=lambda item: (-item[1], item[0])
+        )
+        return [self.plugins[index] for index, _ in ranked]
+
+
+_INDEX: Optional[SearchIndex] = None
+
+
+def get_search_index(plugins: List["Plugin"]) -> SearchIndex:
+    """Build the index once per store snapshot."""
+    global _INDEX
+    if _INDEX is None or _INDEX.plugins is not plugins:
+        _INDEX = SearchIndex(plugins)
+    return _INDEX
+
+
+class PluginLookup:
+    """Hash lookup of plugins by name, module name and package name.
+
+    Package names are compared PEP 503 normalized, plugin names case
+    insensitively.
+    """
+
+    def __init__(self, plugins: List["Plugin"]):
+        self.plugins = plugins
+        self.by_module: Dict[str, List["Plugin"]] = {}
+        self.by_project: Dict[str, List["Plugin"]] = {}
+        self.by_name: Dict[str, List["Plugin"]] = {}
+        for plugin in plugins:
+            self.add(plugin)
+
+    def add(self, plugin: "Plugin") -> None:
+        self.by_module.setdefault(plugin.module_name, []).append(plugin)
+        self.by_project.setdefault(
+            normalize_key(plugin.project_link), []
+        ).append(plugin)
+        self.by_name.setdefault(plugin.name.casefold(), []).append(plugin)
+
+    def get_by_project(self, project: str) -> Optional["Plugin"]:
+        if plugins := self.by_project.get(normalize_key(project)):
+            return plugins[0]
+
+    def resolve(self, name: str) -> "Plugin":
+        """Find the plugin `name` refers to.
+
+        An exact module, package or plugin name wins, otherwise `name`
+        must be part of exactly one of them.
+        """
+        for candidates in (
+            self.by_module.get(name),
+            self.by_project.get(normalize_key(name)),
+            self.by_name.get(name.casefold()),
+        ):
+            if candidates:
+                if len(candidates) > 1:
+                    raise AmbiguousPluginError(name, candidates)
+                return candidates[0]
+
+        key = normalize_key(name)
+        if candidates := [
+            plugin
+            for plugin in get_search_index(self.plugins).search(name)
+            if any(
+                key in normalize_key(getattr(plugin, field))
+                for field in KEY_FIELDS
+            )
+        ]:
+            if len(candidates) > 1:
+                raise AmbiguousPluginError(name, candidates)
+            return candidates[0]
+        raise PluginNotFoundError(name)
+
+    def resolve_many(
+        self, names: Iterable[str]
+    ) -> Tuple[Dict[str, "Plugin"], Dict[str, Exception]]:
+        """Resolve every name, failures are collected instead of raised."""
+        plugins: Dict[str, "Plugin"] = {}
+        errors: Dict[str, Exception] = {}
+        for name in names:
+            try:
+                plugins[name] = self.resolve(name)
+            except (PluginNotFoundError, AmbiguousPluginError) as e:
+                errors[name] = e
+        return plugins, errors
+
+
+_LOOKUP: Optional[PluginLookup] = None
+
+
+def get_plugin_lookup(plugins: List["Plugin"]) -> PluginLookup:
+    """Build the lookup once per store snapshot."""
+    global _LOOKUP
+    if _LOOKUP is None or _LOOKUP.plugins is not plugins:
+        _LOOKUP = PluginLookup(plugins)
+    return _LOOKUP
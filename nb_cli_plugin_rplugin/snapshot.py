@@ -0,0 +1,93 @@
+import io
+import re
+import json
+import time
+import tarfile
+from pathlib import Path
+from typing import Tuple, Union, Iterator
+
+from pydantic import ValidationError
+
+from .config import get_config
+from .storage import CacheEntry, load_entry, save_entry
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MANIFEST = "snapshot.json"
+# the store index, PyPI metadata and GitHub statistics, see `meta`;
+# mirror and rate limit state or the interpreter belong to this machine
+SNAPSHOT_FILES = re.compile(
+    r"^(store/plugins|pypi/[^/]+|github/repos/[^/]+/[^/]+)\.json$"
+)
+
+
+def _snapshot_files() -> Iterator[Tuple[str, Path]]:
+    cache_dir = get_config().cache_dir
+    for path in sorted(cache_dir.rglob("*.json")):
+        name = path.relative_to(cache_dir).as_posix()
+        if SNAPSHOT_FILES.match(name):
+            yield name, path
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _read_member(tar: tarfile.TarFile, name: str) -> bytes:
+    if (file := tar.extractfile(name)) is None:
+        raise KeyError(name)
+    return file.read()
+
+
+def _is_snapshot_file(member: tarfile.TarInfo) -> bool:
+    if not member.isfile() or ".." in member.name.split("/"):
+        return False
+    return bool(SNAPSHOT_FILES.match(member.name))
+
+
+def export_snapshot(file: Union[str, Path]) -> int:
+    """Pack the cached data into a gzipped tarball, returns the file count."""
+    count = 0
+    with tarfile.open(file, "w:gz") as tar:
+        manifest = {"version": SNAPSHOT_VERSION, "created_at": time.time()}
+        _add_bytes(tar, SNAPSHOT_MANIFEST, json.dumps(manifest).encode())
+        for name, path in _snapshot_files():
+            tar.add(path, name, recursive=False)
+            count += 1
+    return count
+
+
+def import_snapshot(file: Union[str, Path]) -> Tuple[int, int]:
+    """Unpack a snapshot into the cache, returns (imported, skipped).
+
+    An entry replaces the cached one only if it was fetched later, so
+    importing an old snapshot never loses fresher data.
+    """
+    imported = skipped = 0
+    with tarfile.open(file, "r:*") as tar:
+        try:
+            manifest = json.loads(_read_member(tar, SNAPSHOT_MANIFEST))
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{file} is not a store snapshot") from e
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot version: {manifest.get('version')}"
+            )
+        for member in tar:
+            if not _is_snapshot_file(member):
+                continue
+            name = member.name
+            try:
+                entry = CacheEntry.parse_raw(_read_member(tar, name))
+            except ValidationError:
+                skipped += 1
+                continue
+            current = load_entry(name)
+            if current is not None and current.fetched_at >= entry.fetched_at:
+                skipped += 1
+                continue
+            save_entry(name, entry)
+            imported += 1
+    return imported, skipped
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import tempfile
+import contextlib
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from .tracing import span
+from .config import get_config
+
+
+class CacheStatus(str, Enum):
+    HIT = "hit"
+    """Fresh entry served from disk."""
+    STALE = "stale"
+    """Expired entry served from disk, revalidation is pending or failed."""
+    REVALIDATED = "revalidated"
+    """Expired entry confirmed unchanged by the server (304)."""
+    MISS = "miss"
+    """Nothing usable on disk, fetched from the network."""
+
+
+class CacheEntry(BaseModel):
+    data: Any
+    fetched_at: float
+    url: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    serial: Optional[int] = None
+    """`X-PyPI-Last-Serial` of the project when it was fetched."""
+    hashes: Optional[List[str]] = None
+    """Hash of each raw item of the store index, see `meta.validate_index`."""
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def is_fresh(self, ttl: float) -> bool:
+        """Usable without revalidation, any entry is while offline."""
+        return get_config().offline or self.age < ttl
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        # validators are only meaningful to the server which issued them
+        if url != self.url:
+            return {}
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def cache_path(name: str) -> Path:
+    return get_config().cache_dir / name
+
+
+def load_entry(name: str) -> Optional[CacheEntry]:
+    path = cache_path(name)
+    with span("cache.load", "decode", file=name):
+        with contextlib.suppress(OSError, ValueError):
+            return CacheEntry.parse_raw(path.read_bytes())
+
+
+def load_json(name: str) -> Any:
+    with contextlib.suppress(OSError, ValueError):
+        return json.loads(cache_path(name).read_bytes())
+
+
+def save_json(name: str, data: Any) -> None:
+    write_text(name, json.dumps(data, ensure_ascii=False))
+
+
+def write_text(name: str, content: str) -> None:
+    """Write the file atomically, a failed write never breaks a command."""
+    path = cache_path(name)
+    with contextlib.suppress(OSError):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+
+def save_entry(name: str, entry: CacheEntry) -> None:
+    write_text(name, entry.json(ensure_ascii=False))
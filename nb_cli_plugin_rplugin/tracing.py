@@ -0,0 +1,279 @@
+import json
+import time
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union, Optional, AsyncIterator
+
+import httpx
+
+
+class Span:
+    """A timed phase, recorded when it exits."""
+
+    __slots__ = ("tracer", "name", "category", "args", "start", "end", "tid")
+
+    def __init__(
+        self, tracer: "Tracer", name: str, category: str, args: Dict[str, Any]
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = self.end = 0.0
+        self.tid = 0
+
+    def set(self, **args: Any) -> None:
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        self.tid = self.tracer.tid()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.spans.append(self)
+
+
+class _NullSpan:
+    """What `span` returns while tracing is disabled."""
+
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class RequestRecord:
+    """An HTTP request, from sending it until its body is closed."""
+
+    __slots__ = (
+        "method",
+        "host",
+        "url",
+        "status",
+        "bytes",
+        "start",
+        "headers_at",
+        "end",
+        "tid",
+        "error",
+    )
+
+    def __init__(self, request: httpx.Request, tid: int):
+        self.method = request.method
+        self.host = request.url.host
+        self.url = str(request.url)
+        self.status: Optional[int] = None
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self.headers_at = self.end = self.start
+        self.tid = tid
+        self.error: Optional[str] = None
+
+
+class CacheEvent:
+    __slots__ = ("kind", "status", "key", "at", "tid")
+
+    def __init__(self, kind: str, status: str, key: str, tid: int):
+        self.kind = kind
+        self.status = status
+        self.key = key
+        self.at = time.perf_counter()
+        self.tid = tid
+
+
+class Tracer:
+    """Spans, HTTP requests and cache lookups of one command.
+
+    Concurrent tasks are kept apart as threads of the trace, so that the
+    spans of each one nest.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.requests: List[RequestRecord] = []
+        self.cache_events: List[CacheEvent] = []
+        # id of an asyncio task -> (trace thread id, task name)
+        self._tasks: Dict[int, Tuple[int, str]] = {}
+
+    def tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        if (known := self._tasks.get(id(task))) is None:
+            known = self._tasks[id(task)] = (
+                len(self._tasks) + 1,
+                task.get_name(),
+            )
+        return known[0]
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace event format, for `chrome://tracing` or Perfetto."""
+
+        def _us(at: float) -> float:
+            return round((at - self.origin) * 1e6, 1)
+
+        events: List[Dict[str, Any]] = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in [(0, "main"), *self._tasks.values()]
+        ]
+        events.extend(
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": _us(span.start),
+                "dur": _us(span.end) - _us(span.start),
+                "pid": 1,
+                "tid": span.tid,
+                "args": span.args,
+            }
+            for span in self.spans
+        )
+        events.extend(
+            {
+                "name": f"{request.method} {request.host}",
+                "cat": "network",
+                "ph": "X",
+                "ts": _us(request.start),
+                "dur": _us(request.end) - _us(request.start),
+                "pid": 1,
+                "tid": request.tid,
+                "args": {
+                    "url": request.url,
+                    "status": request.status,
+                    "bytes": request.bytes,
+                    "headers_ms": (request.headers_at - request.start) * 1000,
+                    "error": request.error,
+                },
+            }
+            for request in self.requests
+        )
+        events.extend(
+            {
+                "name": f"{event.kind} {event.status}",
+                "cat": "cache",
+                "ph": "i",
+                "s": "t",
+                "ts": _us(event.at),
+                "pid": 1,
+                "tid": event.tid,
+                "args": {"key": event.key},
+            }
+            for event in self.cache_events
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, file: Union[str, Path]) -> None:
+        Path(file).write_text(json.dumps(self.chrome_trace()))
+
+
+_TRACER: Optional[Tracer] = None
+
+
+def enable() -> Tracer:
+    """Start recording, for the rest of the command."""
+    global _TRACER
+    if _TRACER is None:
+        _TRACER = Tracer()
+    return _TRACER
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _TRACER
+
+
+def span(
+    name: str, category: str = "phase", **args: Any
+) -> Union[Span, _NullSpan]:
+    """Time the `with` block, a shared no-op unless tracing is enabled."""
+    if _TRACER is None:
+        return _NULL_SPAN
+    return Span(_TRACER, name, category, args)
+
+
+def cache_event(kind: str, status: str, key: str = "") -> None:
+    """Record a cache lookup, `status` is a `CacheStatus` value."""
+    if _TRACER is not None:
+        _TRACER.cache_events.append(
+            CacheEvent(kind, status, key, _TRACER.tid())
+        )
+
+
+class _RecordedStream(httpx.AsyncByteStream):
+    def __init__(
+        self,
+        stream: httpx.AsyncByteStream,
+        record: RequestRecord,
+        tracer: Tracer,
+    ):
+        self.stream = stream
+        self.record = record
+        self.tracer = tracer
+        self.closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            self.record.bytes += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.record.end = time.perf_counter()
+                self.tracer.requests.append(self.record)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Record every request sent through `transport`.
+
+    Bytes are counted as received, before decompression, and a request
+    ends when its body is closed, read to the end or not.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, tracer: Tracer):
+        self.transport = transport
+        self.tracer = tracer
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        record = RequestRecord(request, self.tracer.tid())
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            record.error = e.__class__.__name__
+            record.headers_at = record.end = time.perf_counter()
+            self.tracer.requests.append(record)
+            raise
+        record.status = response.status_code
+        record.headers_at = time.perf_counter()
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _RecordedStream(response.stream, record, self.tracer)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
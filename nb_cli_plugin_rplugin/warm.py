@@ -0,0 +1,169 @@
+import asyncio
+from enum import Enum
+from typing import Set, List, Iterable, Optional, AsyncIterator
+
+from .config import get_config
+from .exception import RateLimitedError
+from .manager import DependencyGraph, _init
+from .github import GRAPHQL_BATCH, github_repo, get_rate_limit
+from .meta import (
+    Plugin,
+    get_pypi_meta_retry,
+    get_cached_pypi_meta,
+    get_github_statistics,
+    get_github_statistics_many,
+    get_cached_github_statistics,
+)
+
+
+class WarmStatus(str, Enum):
+    CACHED = "cached"
+    """Fresh in the cache already, not fetched again."""
+    FETCHED = "fetched"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    """Not fetched because the GitHub API rate limit is used up."""
+
+
+class WarmResult:
+    """Outcome of prefetching one package or repository."""
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        status: WarmStatus,
+        error: Optional[Exception] = None,
+    ):
+        self.kind = kind
+        """`pypi` or `github`."""
+        self.name = name
+        self.status = status
+        self.error = error
+
+
+class CacheWarmer:
+    """Prefetch what `info`, the README viewer and `tree` read.
+
+    PyPI metadata (with the description) and GitHub statistics of every
+    plugin are fetched with at most `concurrency` requests at once, and
+    with `dependencies` also the PyPI metadata of the store plugins they
+    depend on. Fresh cache entries are not fetched again, so a run which
+    was interrupted resumes where it stopped.
+
+    GitHub statistics are fetched by GraphQL batch if there is a token,
+    otherwise one by one until the REST rate limit is used up; the rest
+    is skipped, and fetched by the next run after the reset.
+    """
+
+    def __init__(self, plugins: Iterable[Plugin], dependencies: bool = False):
+        self.plugins = [
+            *{plugin.project_link: plugin for plugin in plugins}.values()
+        ]
+        self.repos = [
+            *dict.fromkeys(
+                repo
+                for plugin in self.plugins
+                if (repo := github_repo(plugin.homepage))
+            )
+        ]
+        self.dependencies = dependencies
+        self.total = len(self.plugins) + len(self.repos)
+        """Results to expect, grows while dependencies are resolved."""
+        self._semaphore = asyncio.Semaphore(get_config().concurrency)
+        self._rate_limited = False
+
+    async def _pypi(self, plugin: Plugin) -> List[WarmResult]:
+        name = plugin.project_link
+        if get_cached_pypi_meta(name) is not None:
+            return [WarmResult("pypi", name, WarmStatus.CACHED)]
+        async with self._semaphore:
+            try:
+                await get_pypi_meta_retry(name)
+            except Exception as e:
+                return [WarmResult("pypi", name, WarmStatus.FAILED, e)]
+        return [WarmResult("pypi", name, WarmStatus.FETCHED)]
+
+    async def _github(self, repo: str) -> List[WarmResult]:
+        if get_cached_github_statistics(repo) is not None:
+            return [WarmResult("github", repo, WarmStatus.CACHED)]
+        async with self._semaphore:
+            if self._rate_limited:
+                return [WarmResult("github", repo, WarmStatus.SKIPPED)]
+            try:
+                await get_github_statistics(repo)
+            except RateLimitedError as e:
+                self._rate_limited = True
+                return [WarmResult("github", repo, WarmStatus.SKIPPED, e)]
+            except Exception as e:
+                return [WarmResult("github", repo, WarmStatus.FAILED, e)]
+        return [WarmResult("github", repo, WarmStatus.FETCHED)]
+
+    async def _github_batch(self, repos: List[str]) -> List[WarmResult]:
+        cached = {
+            repo
+            for repo in repos
+            if get_cached_github_statistics(repo) is not None
+        }
+        async with self._semaphore:
+            # never raises, what could not be fetched is left out
+            fetched = await get_github_statistics_many(repos)
+        missing = WarmStatus.FAILED
+        if not get_rate_limit("graphql").allow(refresh=False):
+            missing = WarmStatus.SKIPPED
+        results = []
+        for repo in repos:
+            status = WarmStatus.FETCHED if repo in fetched else missing
+            if repo in cached:
+                status = WarmStatus.CACHED
+            results.append(WarmResult("github", repo, status))
+        return results
+
+    async def _resolve_dependencies(self) -> List[WarmResult]:
+        await _init()
+        graph = DependencyGraph(self.plugins)
+        roots = set(graph.roots)
+        cached: Set[str] = set()
+
+        def _check_cache():
+            # called after each level, the next one is added but not fetched
+            for key, name in graph.names.items():
+                if key in graph.metas:
+                    continue
+                if get_cached_pypi_meta(name) is not None:
+                    cached.add(key)
+
+        await graph.resolve(_check_cache)
+        results = []
+        for key, meta in graph.metas.items():
+            if key in roots:
+                continue
+            if isinstance(meta, Exception):
+                status, error = WarmStatus.FAILED, meta
+            elif key in cached:
+                status, error = WarmStatus.CACHED, None
+            else:
+                status, error = WarmStatus.FETCHED, None
+            results.append(WarmResult("pypi", graph.names[key], status, error))
+        return results
+
+    async def run(self) -> AsyncIterator[WarmResult]:
+        """Yield results in completion order."""
+        coros = [self._pypi(plugin) for plugin in self.plugins]
+        if get_config().github_token:
+            coros.extend(
+                self._github_batch(self.repos[i : i + GRAPHQL_BATCH])
+                for i in range(0, len(self.repos), GRAPHQL_BATCH)
+            )
+        else:
+            coros.extend(self._github(repo) for repo in self.repos)
+        for future in asyncio.as_completed(coros):
+            for result in await future:
+                yield result
+
+        if self.dependencies:
+            # the plugins themselves are cached by now
+            results = await self._resolve_dependencies()
+            self.total += len(results)
+            for result in results:
+                yield result
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Callable
+
+import httpx
+import pytest
+from nb_cli import cache
+
+from nb_cli_plugin_rplugin.config import get_config
+from nb_cli_plugin_rplugin import client, resilience
+
+PYPI_URL = "https://pypi.test/pypi"
+
+
+@pytest.fixture(autouse=True)
+def rplugin_env(tmp_path, monkeypatch):
+    """A fresh cache directory and no state left by other tests."""
+    monkeypatch.setenv("RPLUGIN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("RPLUGIN_PYPI_URL", PYPI_URL)
+    monkeypatch.setenv("RPLUGIN_BACKOFF_BASE", "0")
+    get_config.cache_clear()
+    resilience._BREAKERS.clear()
+    resilience._DEADLINE = None
+    client._CLIENTS.clear()
+    asyncio.run(cache.clear())
+    yield
+    get_config.cache_clear()
+
+
+@pytest.fixture
+def mock_http(monkeypatch):
+    """Send every request of the clients to `handler`."""
+
+    def _mock(handler: Callable[[httpx.Request], httpx.Response]):
+        client._CLIENTS.clear()
+        monkeypatch.setattr(
+            client,
+            "_new_client",
+            lambda url: httpx.AsyncClient(
+                transport=httpx.MockTransport(handler)
+            ),
+        )
+
+    return _mock
+
+
+def pypi_json(name: str, version: str = "1.0.0") -> dict:
+    return {
+        "info": {
+            "name": name,
+            "version": version,
+            "keywords": "",
+            "requires_python": ">=3.8",
+            "requires_dist": [],
+            "description": "",
+        },
+        "releases": {},
+    }
@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+import pytest
+
+from nb_cli_plugin_rplugin.meta import get_github_statistics_many
+
+REPOS = ["author/demo0", "author/demo1"]
+
+
+@pytest.fixture(autouse=True)
+def github_env(monkeypatch):
+    monkeypatch.setenv("RPLUGIN_GITHUB_API_URL", "https://api.github.test")
+    monkeypatch.setenv("RPLUGIN_GITHUB_TOKEN", "token")
+    monkeypatch.setenv("RPLUGIN_RETRIES", "0")
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        None,
+        [],
+        {"data": None, "errors": [{"message": "Something went wrong"}]},
+        {"data": {"r0": None, "r1": None}},
+        {"data": {"r0": {"nameWithOwner": "author/demo0"}, "r1": []}},
+    ],
+)
+def test_graphql_error_payload(mock_http, body):
+    mock_http(lambda request: httpx.Response(200, json=body))
+
+    assert asyncio.run(get_github_statistics_many(REPOS)) == {}
+
+
+def test_graphql_timeout(mock_http):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise asyncio.TimeoutError
+
+    mock_http(handler)
+
+    assert asyncio.run(get_github_statistics_many(REPOS)) == {}
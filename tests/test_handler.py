@@ -0,0 +1,48 @@
+import asyncio
+from typing import Dict
+
+from nb_cli_plugin_rplugin import handler
+from nb_cli_plugin_rplugin.meta import Repo, Plugin
+
+
+def _plugin(i: int) -> Plugin:
+    return Plugin(
+        module_name=f"nonebot_plugin_demo{i}",
+        project_link=f"nonebot-plugin-demo{i}",
+        name=f"Demo {i}",
+        desc="A demo plugin",
+        author="author",
+        homepage=f"https://github.com/author/demo{i}",
+        tags=[],
+        is_official=False,
+    )
+
+
+def test_page_shows_statistics_that_arrive_later(monkeypatch):
+    stats: Dict[str, Repo] = {}
+
+    async def get_plugins_statistics(plugins):
+        return dict(stats)
+
+    monkeypatch.setattr(
+        handler, "get_plugins_statistics", get_plugins_statistics
+    )
+    pages = handler.PluginPages([_plugin(i) for i in range(4)], 2)
+
+    async def _print() -> str:
+        with handler.console.capture() as capture:
+            await pages.print(1)
+        pages.close()
+        return capture.get()
+
+    assert "⭐" not in asyncio.run(_print())
+    stats["author/demo0"] = Repo(
+        full_name="author/demo0",
+        stargazers_count=42,
+        open_issues_count=0,
+        forks_count=0,
+        archived=True,
+    )
+    output = asyncio.run(_print())
+    assert "⭐42" in output
+    assert handler.ARCHIVED in output
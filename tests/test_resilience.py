@@ -0,0 +1,73 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+from nb_cli import cache
+
+from nb_cli_plugin_rplugin import resilience
+from nb_cli_plugin_rplugin.meta import get_pypi_meta_retry
+from nb_cli_plugin_rplugin.exception import (
+    StatusError,
+    CircuitOpenError,
+    DeadlineExceededError,
+)
+
+from .conftest import pypi_json
+
+
+def _cache_demo(mock_http):
+    mock_http(lambda request: httpx.Response(200, json=pypi_json("demo")))
+    asyncio.run(get_pypi_meta_retry("demo"))
+    # a new command, only the disk cache is left
+    asyncio.run(cache.clear())
+    mock_http(lambda request: httpx.Response(503))
+
+
+def test_cached_pypi_meta_with_open_circuit(mock_http):
+    _cache_demo(mock_http)
+    resilience.get_breaker("pypi.test").opened_at = time.monotonic()
+
+    assert asyncio.run(get_pypi_meta_retry("demo")).version == "1.0.0"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(get_pypi_meta_retry("other"))
+
+
+def test_cached_pypi_meta_after_deadline(mock_http):
+    _cache_demo(mock_http)
+    resilience._DEADLINE = time.monotonic() - 1
+
+    assert asyncio.run(get_pypi_meta_retry("demo")).version == "1.0.0"
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(get_pypi_meta_retry("other"))
+
+
+def test_failing_packages_do_not_open_circuit(mock_http):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "/bad" in request.url.path:
+            return httpx.Response(503)
+        return httpx.Response(200, json=pypi_json("good"))
+
+    mock_http(handler)
+
+    async def _run():
+        for name in ("bad1", "bad2"):
+            with pytest.raises(StatusError):
+                await get_pypi_meta_retry(name)
+        return await get_pypi_meta_retry("good")
+
+    assert asyncio.run(_run()).version == "1.0.0"
+    # each package counts once, not once per attempt
+    assert resilience.get_breaker("pypi.test").failures == 0
+
+
+def test_failure_counted_once_per_request(mock_http):
+    mock_http(lambda request: httpx.Response(503))
+
+    async def _run():
+        for name in ("bad1", "bad2"):
+            with pytest.raises(StatusError):
+                await get_pypi_meta_retry(name)
+
+    asyncio.run(_run())
+    assert resilience.get_breaker("pypi.test").failures == 2